@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from answerCodec import codecs
+from experts import conditions
+from metrics import ANALYSIS_CACHE_ENTRIES, ANALYSIS_CACHE_EVENTS
+from modelRegistry import model_version
+
+load_dotenv()
+
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 4096))
+ANALYSIS_CACHE_TTL = float(os.getenv('ANALYSIS_CACHE_TTL', 3600))
+
+_facts: Dict[str, Tuple[str, ...]] = {condition: tuple(question.fact for question in quiz.questions)
+                                      for condition, (_, quiz) in conditions.items()}
+
+
+def canonical_key(condition: str, answers: Mapping[str, Any]) -> Optional[Hashable]:
+    # The engines read exactly their quiz's facts, so answers are reduced to those; extra keys
+    # do not split the cache. Canonical answers are keyed by their packed form, anything else
+    # by the raw values, which keep their type ('14' and 14 take different paths through the
+    # rules); an int never equals a tuple, so the two cannot collide. Lists are frozen into
+    # tuples to be hashable. The model version retires entries computed against a definition
+    # that has since been re-registered or invalidated. Returns None for input the engines
+    # would reject, which then bypasses the cache.
+    facts = _facts.get(condition)
+    if facts is None or any(fact not in answers for fact in facts):
+        return None
+    try:
+        packed = codecs[condition].encode(answers)
+    except ValueError:
+        return condition, model_version(condition), tuple(
+            tuple(answers[fact]) if isinstance(answers[fact], list) else answers[fact] for fact in facts)
+    return condition, model_version(condition), packed
+
+
+class AnalysisCache:
+    # LRU with a TTL, owned by the event loop (no locking). Concurrent misses on the same key
+    # share one computation; failures are handed to every waiter and never stored.
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE, ttl: float = ANALYSIS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    async def get(self, condition: str, answers: Mapping[str, Any], compute: Callable[[], Awaitable[Any]]):
+        key = canonical_key(condition, answers) if self.enabled else None
+        if key is None:
+            return await compute()
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                ANALYSIS_CACHE_EVENTS.inc(condition, 'hit')
+                return result
+            del self.entries[key]
+            ANALYSIS_CACHE_EVENTS.inc(condition, 'expired')
+            ANALYSIS_CACHE_ENTRIES.set(len(self.entries))
+
+        pending = self.inflight.get(key)
+        if pending is not None:
+            ANALYSIS_CACHE_EVENTS.inc(condition, 'coalesced')
+            try:
+                # shield: a waiter giving up must not cancel the computation the others await.
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The request computing it was cancelled; take over.
+            return await self.get(condition, answers, compute)
+
+        ANALYSIS_CACHE_EVENTS.inc(condition, 'miss')
+        pending = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as error:
+            pending.set_exception(error)
+            # Retrieved here so an error nobody else waited for is not logged as unhandled.
+            pending.exception()
+            raise
+        else:
+            pending.set_result(result)
+            self._store(condition, key, result)
+            return result
+        finally:
+            del self.inflight[key]
+
+    def _store(self, condition: str, key: Hashable, result: Any):
+        self.entries[key] = (time.monotonic() + self.ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            ANALYSIS_CACHE_EVENTS.inc(evicted[0], 'eviction')
+        ANALYSIS_CACHE_ENTRIES.set(len(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+        ANALYSIS_CACHE_ENTRIES.set(0)
+
+
+analysis_cache = AnalysisCache()
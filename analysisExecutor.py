@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+import experts  # registers every condition's model, also inside spawned workers
+from metrics import (ANALYSIS_QUEUE_DEPTH, ANALYSIS_QUEUE_WAIT, ANALYSIS_REJECTIONS, drain_worker_metrics,
+                     merge_worker_metrics)
+from modelRegistry import preload_models
+
+load_dotenv()
+
+ANALYSIS_EXECUTOR = os.getenv('ANALYSIS_EXECUTOR', 'thread')
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+# 'eager' builds the models before the app starts serving, 'background' right after startup,
+# 'lazy' on first use. Requests that need a model still being built wait for it.
+MODEL_PRELOAD = os.getenv('MODEL_PRELOAD', 'background')
+# Requests allowed to wait for a worker; beyond that they are turned away at once.
+ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', 64))
+# Seconds a request may spend waiting for a worker and running, together.
+ANALYSIS_DEADLINE = float(os.getenv('ANALYSIS_DEADLINE', 10))
+ANALYSIS_RETRY_AFTER = int(os.getenv('ANALYSIS_RETRY_AFTER', 1))
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisOverloaded(Exception):
+    # Shed without running: the wait queue was full or the deadline passed while queued.
+    def __init__(self, retry_after: int = ANALYSIS_RETRY_AFTER):
+        super().__init__("Servicio saturado; intente de nuevo más tarde.")
+        self.retry_after = retry_after
+
+
+class AnalysisDeadlineExceeded(Exception):
+    def __init__(self):
+        super().__init__("El análisis excedió el tiempo límite.")
+
+
+def _warm_worker():
+    preload_models()
+
+
+def _warm_in_background():
+    try:
+        preload_models()
+    except Exception:
+        logger.exception("No se pudieron precargar los modelos; se construirán al primer uso.")
+
+
+def _run_in_worker(fn: Callable, *args):
+    return fn(*args), drain_worker_metrics()
+
+
+class AnalysisExecutor:
+    def __init__(self, kind: str = ANALYSIS_EXECUTOR, workers: int = ANALYSIS_WORKERS,
+                 preload: str = MODEL_PRELOAD, queue_size: int = ANALYSIS_QUEUE_SIZE,
+                 deadline: float = ANALYSIS_DEADLINE, retry_after: int = ANALYSIS_RETRY_AFTER):
+        if kind not in ('thread', 'process'):
+            raise ValueError("ANALYSIS_EXECUTOR debe ser 'thread' o 'process'.")
+        if preload not in ('eager', 'background', 'lazy'):
+            raise ValueError("MODEL_PRELOAD debe ser 'eager', 'background' o 'lazy'.")
+        self.kind = kind
+        self.workers = workers
+        self.preload = preload
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self.executor: Optional[Executor] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.active = 0
+
+    def start(self):
+        if self.kind == 'process':
+            # Each worker builds its own copy of the models. The parent builds them too, but only
+            # when analytics first needs a posterior table, usually after the workers have forked.
+            if self.preload == 'lazy':
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+                # Spawn the workers now so the first requests do not pay for model loading.
+                warmups = [self.executor.submit(_warm_worker) for _ in range(self.workers)]
+                if self.preload == 'eager':
+                    for future in warmups:
+                        future.result()
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis')
+            if self.preload == 'eager':
+                preload_models()
+            elif self.preload == 'background':
+                threading.Thread(target=_warm_in_background, name='model-preload', daemon=True).start()
+        # Never hand the pool more work than it has workers, so cancelled requests are dropped
+        # while still waiting here instead of sitting in the executor queue.
+        self.slots = asyncio.Semaphore(self.workers)
+        self.waiting = 0
+        self.active = 0
+
+    async def run(self, fn: Callable, *args, deadline: Optional[float] = None):
+        # `deadline` is a time.monotonic() instant; by default the request gets self.deadline
+        # seconds from now.
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        # Requests already waiting take the free workers first; whatever is left over queues.
+        if self.waiting - (self.workers - self.active) >= self.queue_size:
+            ANALYSIS_REJECTIONS.inc('queue_full')
+            raise AnalysisOverloaded(self.retry_after)
+
+        queued = time.monotonic()
+        self.waiting += 1
+        ANALYSIS_QUEUE_DEPTH.set(self.waiting)
+        try:
+            await asyncio.wait_for(self.slots.acquire(), deadline - queued)
+        except asyncio.TimeoutError:
+            ANALYSIS_REJECTIONS.inc('queue_timeout')
+            raise AnalysisOverloaded(self.retry_after)
+        finally:
+            self.waiting -= 1
+            ANALYSIS_QUEUE_DEPTH.set(self.waiting)
+        self.active += 1
+        ANALYSIS_QUEUE_WAIT.observe(time.monotonic() - queued)
+
+        try:
+            if self.kind == 'process':
+                future = self.executor.submit(_run_in_worker, fn, *args)
+            else:
+                future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is given back when the call really finishes, not when its caller stops
+        # waiting, so the pool never holds more than `workers` calls even after timeouts.
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(self._finish, done))
+
+        try:
+            # wrap_future cancels the call if it has not started yet.
+            result = await asyncio.wait_for(asyncio.wrap_future(future), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            ANALYSIS_REJECTIONS.inc('deadline')
+            raise AnalysisDeadlineExceeded()
+        if self.kind == 'process':
+            result = result[0]
+        return result
+
+    def _finish(self, future):
+        self._release()
+        # Merged here rather than by the caller so the metrics of a run that outlived its
+        # deadline are still counted.
+        if self.kind == 'process' and not future.cancelled() and future.exception() is None:
+            merge_worker_metrics(future.result()[1])
+
+    def _release(self):
+        self.active -= 1
+        self.slots.release()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+analysis_executor = AnalysisExecutor()
@@ -0,0 +1,115 @@
+import base64
+import binascii
+from typing import Any, Dict, List, Mapping, NamedTuple
+
+from dtos import Quiz
+from experts import conditions
+
+SINGLE_CHOICE = 1
+MULTIPLE_CHOICE = 2
+SCORE = 3
+# A score question sums one 0-4 rating per listed item.
+SCORE_ITEM_MAX = 4
+
+
+class Field(NamedTuple):
+    fact: str
+    answer_mode: int
+    options: int
+    shift: int
+    width: int
+    choices: Dict[str, int]  # '1'..'n' -> option index
+
+
+class AnswerCodec:
+    # Packs a quiz's answers into a fixed-width integer, one bit field per question in quiz
+    # order: the option index for single choice, a bitmask of the chosen options for multiple
+    # choice and the total for scores. Only the canonical form is packed (options as the
+    # strings '1'..'n', multiple choice as a list of those, scores as ints); the rules treat
+    # 1 and '1', or 'No' and '2', differently, so anything else raises ValueError rather than
+    # being folded into a canonical answer it does not behave like.
+    def __init__(self, quiz: Quiz):
+        self.fields: List[Field] = []
+        shift = 0
+        for question in quiz.questions:
+            options = len(question.options)
+            if question.answer_mode == SCORE:
+                width = (options * SCORE_ITEM_MAX).bit_length()
+            elif question.answer_mode == MULTIPLE_CHOICE:
+                width = options
+            else:
+                width = (options - 1).bit_length()
+            choices = {str(number): number - 1 for number in range(1, options + 1)}
+            self.fields.append(Field(question.fact, question.answer_mode, options, shift, width, choices))
+            shift += width
+        self.bits = shift
+        self.byte_length = max((shift + 7) // 8, 1)
+
+    def encode(self, answers: Mapping[str, Any]) -> int:
+        packed = 0
+        for field in self.fields:
+            packed |= self._encode_value(field, answers[field.fact]) << field.shift
+        return packed
+
+    def _encode_value(self, field: Field, value: Any) -> int:
+        if field.answer_mode == SCORE:
+            if type(value) is int and 0 <= value <= field.options * SCORE_ITEM_MAX:
+                return value
+        elif field.answer_mode == MULTIPLE_CHOICE:
+            if isinstance(value, list):
+                mask = 0
+                for option in value:
+                    mask |= 1 << self._option_index(field, option)
+                return mask
+        else:
+            return self._option_index(field, value)
+        raise ValueError(f"Respuesta no canónica para '{field.fact}': {value!r}")
+
+    def _option_index(self, field: Field, value: Any) -> int:
+        if type(value) is str and value in field.choices:
+            return field.choices[value]
+        raise ValueError(f"Respuesta no canónica para '{field.fact}': {value!r}")
+
+    def decode(self, packed: int) -> Dict[str, Any]:
+        if packed < 0 or packed >> self.bits:
+            raise ValueError("Respuestas codificadas inválidas.")
+        answers = {}
+        for field in self.fields:
+            value = (packed >> field.shift) & ((1 << field.width) - 1)
+            if field.answer_mode == SCORE:
+                if value > field.options * SCORE_ITEM_MAX:
+                    raise ValueError("Respuestas codificadas inválidas.")
+                answers[field.fact] = value
+            elif field.answer_mode == MULTIPLE_CHOICE:
+                answers[field.fact] = [str(index + 1) for index in range(field.options) if value >> index & 1]
+            else:
+                if value >= field.options:
+                    raise ValueError("Respuestas codificadas inválidas.")
+                answers[field.fact] = str(value + 1)
+        return answers
+
+    def to_bytes(self, packed: int) -> bytes:
+        return packed.to_bytes(self.byte_length, 'big')
+
+    def from_bytes(self, data: bytes) -> int:
+        if len(data) != self.byte_length:
+            raise ValueError("Respuestas codificadas inválidas.")
+        return int.from_bytes(data, 'big')
+
+    def to_text(self, packed: int) -> str:
+        # URL-safe base64 without padding: the wire form of packed answers.
+        return base64.urlsafe_b64encode(self.to_bytes(packed)).rstrip(b'=').decode('ascii')
+
+    def from_text(self, text: str) -> int:
+        try:
+            data = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+        except (binascii.Error, ValueError):
+            raise ValueError("Respuestas codificadas inválidas.")
+        return self.from_bytes(data)
+
+
+codecs: Dict[str, AnswerCodec] = {condition: AnswerCodec(quiz) for condition, (_, quiz) in conditions.items()}
+
+
+def get_codec(condition: str) -> AnswerCodec:
+    return codecs[condition]
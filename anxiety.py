@@ -1,10 +1,14 @@
+import logging
+from typing import Dict
+
 from experta import *
-from pgmpy.models import BayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.inference import VariableElimination
 
 from dtos import Quiz, Question
-from entity import Expert
+from entity import Expert, fact_values
+from modelRegistry import register_model, get_model
+from resultCatalog import band_of, register_texts
+
+logger = logging.getLogger(__name__)
 
 anxiety_quiz = Quiz([
         Question(
@@ -54,39 +58,109 @@ anxiety_quiz = Quiz([
         )
     ])
 
-class AnxietyExpertSystem(KnowledgeEngine):
+
+def build_anxiety_model():
+    from pgmpy.factors.discrete import TabularCPD
+    from pgmpy.models import BayesianNetwork
+
+    model = BayesianNetwork([
+        ('SleepProblems', 'Anxiety'),
+        ('CaffeineUse', 'Anxiety'),
+        ('MedicationUse', 'Anxiety'),
+        ('PsychologicalIssues', 'Anxiety')
+    ])
+
+    cpd_sleep_problems = TabularCPD(variable='SleepProblems', variable_card=2, values=[[0.7], [0.3]])
+    cpd_caffeine_use = TabularCPD(variable='CaffeineUse', variable_card=2, values=[[0.6], [0.4]])
+    cpd_medication_use = TabularCPD(variable='MedicationUse', variable_card=2, values=[[0.8], [0.2]])
+    cpd_psychological_issues = TabularCPD(variable='PsychologicalIssues', variable_card=2, values=[[0.5], [0.5]])
+
+    cpd_anxiety = TabularCPD(
+        variable='Anxiety', variable_card=2,
+        values=[
+            [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.75, 0.65, 0.55, 0.45, 0.7, 0.6, 0.5, 0.4],  # No Anxiety
+            [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.25, 0.35, 0.45, 0.55, 0.3, 0.4, 0.5, 0.6]  # Anxiety
+        ],
+        evidence=['SleepProblems', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'],
+        evidence_card=[2, 2, 2, 2]
+    )
+
+    model.add_cpds(cpd_sleep_problems, cpd_caffeine_use, cpd_medication_use, cpd_psychological_issues,
+                   cpd_anxiety)
+    model.check_model()
+    return model
+
+
+anxiety_evidence = [
+    'SleepProblems', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'
+]
+
+
+def encode_anxiety_evidence(answers) -> Dict[str, int]:
+    return {
+        'SleepProblems': 0 if answers['sleep_problems'] == '2' else 1,
+        'CaffeineUse': 1 if answers['lifestyle_factor'] in ['1', '2'] else 0,
+        'MedicationUse': 0 if answers['medication_use'] == '5' else 1,
+        'PsychologicalIssues': 0 if answers['psychological_cause'] == '3' else 1
+    }
+
+
+anxiety_texts = {
+    'see_professional':
+        "Recomendamos que consulte a un profesional de la salud para un diagnóstico y tratamiento más detallado.",
+    'general_practices': "Puede considerar implementar las siguientes prácticas generales:",
+    'practice_routine': "- Mantener una rutina diaria regular.",
+    'practice_relaxation': "- Practicar técnicas de relajación.",
+    'practice_caffeine_alcohol': "- Evitar el consumo excesivo de cafeína y alcohol.",
+    'practice_sleep_environment': "- Crear un ambiente de sueño adecuado.",
+    'medical_condition': "Consulte con un profesional de la salud para tratar la condición médica subyacente.",
+    'stress_techniques': "Considere técnicas de manejo del estrés como mindfulness y respiración profunda.",
+    'depression_therapy': "Considere hablar con un terapeuta sobre opciones de tratamiento para la depresión.",
+    'review_medication': "Revise los medicamentos con su médico para ver si pueden estar afectando su ansiedad.",
+    'reduce_caffeine': "Reduzca el consumo de cafeína.",
+    'reduce_alcohol': "Reduzca el consumo de alcohol.",
+    'improve_diet': "Mejore su alimentación.",
+    'exercise': "Incorpore ejercicio regular en su rutina diaria.",
+    'reduce_screens': "Reduzca el uso de dispositivos electrónicos.",
+    'sleep_hygiene': "Intente mejorar su higiene del sueño.",
+    'posterior': "Probabilidad calculada de ansiedad: {posterior}",
+    'band_low': "Pruebe técnicas de relajación como la respiración profunda o el mindfulness.",
+    'band_moderate':
+        "Considere hablar con un terapeuta sobre sus preocupaciones y busque apoyo en amigos y familiares.",
+    'band_moderately_high':
+        "Es recomendable buscar ayuda profesional para obtener un diagnóstico preciso y considerar opciones de tratamiento.",
+    'band_high': "Es crucial buscar ayuda profesional de inmediato para un tratamiento adecuado y el apoyo necesario.",
+    'high_avoid_substances':
+        "Evite el consumo de alcohol y drogas recreativas, ya que pueden empeorar los síntomas de la ansiedad.",
+    'high_stress_management':
+        "Pruebe técnicas de manejo del estrés como el ejercicio regular, la meditación o el yoga.",
+    'high_cbt':
+        "Hable con su médico sobre la posibilidad de terapia cognitivo-conductual (TCC) o medicación para la ansiedad.",
+    'high_support_group':
+        "Considere la posibilidad de unirse a un grupo de apoyo o buscar terapia individual para obtener apoyo adicional.",
+    'high_self_care':
+        "Priorice el autocuidado y establezca límites saludables en su vida diaria para reducir el estrés.",
+}
+
+
+register_model('anxiety', build_anxiety_model, 'Anxiety', anxiety_evidence, encode_anxiety_evidence)
+register_texts('anxiety', anxiety_texts, bands=('band_low', 'band_moderate', 'band_moderately_high', 'band_high'),
+               thresholds=(0.30, 0.40, 0.50, 0.60))
+
+
+class AnxietyExpertSystem(Expert):
+    condition = 'anxiety'
+
     @DefFacts()
     def _initial_action(self):
         yield Fact(action="find_anxiety")
 
     def __init__(self):
         super().__init__()
-        self.model = BayesianNetwork([
-            ('SleepProblems', 'Anxiety'),
-            ('CaffeineUse', 'Anxiety'),
-            ('MedicationUse', 'Anxiety'),
-            ('PsychologicalIssues', 'Anxiety')
-        ])
-
-        cpd_sleep_problems = TabularCPD(variable='SleepProblems', variable_card=2, values=[[0.7], [0.3]])
-        cpd_caffeine_use = TabularCPD(variable='CaffeineUse', variable_card=2, values=[[0.6], [0.4]])
-        cpd_medication_use = TabularCPD(variable='MedicationUse', variable_card=2, values=[[0.8], [0.2]])
-        cpd_psychological_issues = TabularCPD(variable='PsychologicalIssues', variable_card=2, values=[[0.5], [0.5]])
-
-        cpd_anxiety = TabularCPD(
-            variable='Anxiety', variable_card=2,
-            values=[
-                [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.75, 0.65, 0.55, 0.45, 0.7, 0.6, 0.5, 0.4],  # No Anxiety
-                [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.25, 0.35, 0.45, 0.55, 0.3, 0.4, 0.5, 0.6]  # Anxiety
-            ],
-            evidence=['SleepProblems', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'],
-            evidence_card=[2, 2, 2, 2]
-        )
-
-        self.model.add_cpds(cpd_sleep_problems, cpd_caffeine_use, cpd_medication_use, cpd_psychological_issues,
-                            cpd_anxiety)
-        self.model.check_model()
-        self.inference = VariableElimination(self.model)
+        compiled = get_model(self.condition)
+        self.model = compiled.model
+        self.inference = compiled.inference
+        self.posterior = compiled.posterior
         self.recommendations = []
         self.diagnosis = []
 
@@ -109,35 +183,32 @@ class AnxietyExpertSystem(KnowledgeEngine):
     def process_daytime_impact(self, daytime_impact):
         self.diagnosis.append(f"Impacto en la vida diaria: {daytime_impact['daytime_impact']}")
         if daytime_impact['daytime_impact'] in ['4', '5']:
-            self.recommendations.append(
-                "Recomendamos que consulte a un profesional de la salud para un diagnóstico y tratamiento más detallado.")
+            self.recommend('see_professional')
         else:
-            self.recommendations.append("Puede considerar implementar las siguientes prácticas generales:")
-            self.recommendations.append("- Mantener una rutina diaria regular.")
-            self.recommendations.append("- Practicar técnicas de relajación.")
-            self.recommendations.append("- Evitar el consumo excesivo de cafeína y alcohol.")
-            self.recommendations.append("- Crear un ambiente de sueño adecuado.")
+            self.recommend('general_practices')
+            self.recommend('practice_routine')
+            self.recommend('practice_relaxation')
+            self.recommend('practice_caffeine_alcohol')
+            self.recommend('practice_sleep_environment')
         self.declare(Fact(action='process_physiological_cause'))
 
     @Rule(Fact(action='process_physiological_cause'), AS.physiological_cause << Fact(physiological_cause=W()))
     def process_physiological_cause(self, physiological_cause):
         if physiological_cause['physiological_cause'] != '5':
             self.diagnosis.append(f"Causa fisiológica potencial: {physiological_cause['physiological_cause']}")
-            self.recommendations.append("Consulte con un profesional de la salud para tratar la condición médica subyacente.")
+            self.recommend('medical_condition')
         if physiological_cause['physiological_cause'] != '3':
             if physiological_cause['physiological_cause'] == '1':
-                self.recommendations.append(
-                    "Considere técnicas de manejo del estrés como mindfulness y respiración profunda.")
+                self.recommend('stress_techniques')
             elif physiological_cause['physiological_cause'] == '2':
-                self.recommendations.append(
-                    "Considere hablar con un terapeuta sobre opciones de tratamiento para la depresión.")
+                self.recommend('depression_therapy')
         self.declare(Fact(action='process_medication_use'))
 
     @Rule(Fact(action='process_medication_use'), AS.medication_use << Fact(medication_use=W()))
     def process_medication_use(self, medication_use):
         if medication_use['medication_use'] != '5':
             self.diagnosis.append(f"Uso de medicación potencialmente influyente: {medication_use['medication_use']}")
-            self.recommendations.append("Revise los medicamentos con su médico para ver si pueden estar afectando su ansiedad.")
+            self.recommend('review_medication')
         self.declare(Fact(action='process_lifestyle_factor'))
 
     @Rule(Fact(action='process_lifestyle_factor'), AS.lifestyle_factor << Fact(lifestyle_factor=W()))
@@ -147,22 +218,22 @@ class AnxietyExpertSystem(KnowledgeEngine):
                 f"Factor de estilo de vida potencialmente influyente: {lifestyle_factor['lifestyle_factor']}")
         if lifestyle_factor['lifestyle_factor'] != '6':
             if lifestyle_factor['lifestyle_factor'] == '1':
-                self.recommendations.append("Reduzca el consumo de cafeína.")
+                self.recommend('reduce_caffeine')
             elif lifestyle_factor['lifestyle_factor'] == '2':
-                self.recommendations.append("Reduzca el consumo de alcohol.")
+                self.recommend('reduce_alcohol')
             elif lifestyle_factor['lifestyle_factor'] == '3':
-                self.recommendations.append("Mejore su alimentación.")
+                self.recommend('improve_diet')
             elif lifestyle_factor['lifestyle_factor'] == '4':
-                self.recommendations.append("Incorpore ejercicio regular en su rutina diaria.")
+                self.recommend('exercise')
             elif lifestyle_factor['lifestyle_factor'] == '5':
-                self.recommendations.append("Reduzca el uso de dispositivos electrónicos.")
+                self.recommend('reduce_screens')
         self.declare(Fact(action='process_sleep_problems'))
 
     @Rule(Fact(action='process_sleep_problems'), AS.sleep_problems << Fact(sleep_problems=W()))
     def process_sleep_problems(self, sleep_problems):
         if sleep_problems['sleep_problems'] != '2':
             self.diagnosis.append(f"Problemas de sueño: {sleep_problems['sleep_problems']}")
-            self.recommendations.append("Intente mejorar su higiene del sueño.")
+            self.recommend('sleep_hygiene')
         self.declare(Fact(action='evaluate_anxiety_risk'))
 
     @Rule(Fact(action='evaluate_anxiety_risk'),
@@ -175,44 +246,34 @@ class AnxietyExpertSystem(KnowledgeEngine):
           AS.sleep_problems << Fact(sleep_problems=W()))
     def evaluate_anxiety_risk(self, anxiety_symptoms, daytime_impact, physiological_cause, medication_use,
                               psychological_cause, lifestyle_factor, sleep_problems):
-        evidence = {
-            'SleepProblems': 0 if sleep_problems['sleep_problems'] == '2' else 1,
-            'CaffeineUse': 1 if lifestyle_factor['lifestyle_factor'] in ['1', '2'] else 0,
-            'MedicationUse': 0 if medication_use['medication_use'] == '5' else 1,
-            'PsychologicalIssues': 0 if psychological_cause['psychological_cause'] == '3' else 1
-        }
-        prob_anxiety = self.inference.query(variables=['Anxiety'], evidence=evidence).values[1]
-        print("Probabilidad calculada de ansiedad:", prob_anxiety)
-        self.recommendations.append(f"Probabilidad calculada de ansiedad: {prob_anxiety}")
-
-        if 0.30 <= prob_anxiety < 0.40:
+        evidence = encode_anxiety_evidence(fact_values(sleep_problems, lifestyle_factor, medication_use,
+                                                       psychological_cause))
+        prob_anxiety = self.posterior_of(evidence)
+        logger.debug("Probabilidad calculada de ansiedad: %s", prob_anxiety)
+        self.probability = float(prob_anxiety)
+        self.band = band_of(self.condition, prob_anxiety)
+        self.recommend('posterior')
+
+        if self.band == 1:
             self.diagnosis.append("Su probabilidad de ansiedad está en un rango bajo.")
-            self.recommendations.append("Pruebe técnicas de relajación como la respiración profunda o el mindfulness.")
+            self.recommend('band_low')
 
-        elif 0.40 <= prob_anxiety < 0.50:
+        elif self.band == 2:
             self.diagnosis.append("Su probabilidad de ansiedad es moderada.")
-            self.recommendations.append(
-                "Considere hablar con un terapeuta sobre sus preocupaciones y busque apoyo en amigos y familiares.")
+            self.recommend('band_moderate')
 
-        elif 0.50 <= prob_anxiety < 0.60:
+        elif self.band == 3:
             self.diagnosis.append("Su probabilidad de ansiedad es moderadamente alta.")
-            self.recommendations.append(
-                "Es recomendable buscar ayuda profesional para obtener un diagnóstico preciso y considerar opciones de tratamiento.")
+            self.recommend('band_moderately_high')
 
-        elif prob_anxiety >= 0.60:
+        elif self.band == 4:
             self.diagnosis.append("Su probabilidad de ansiedad es alta.")
-            self.recommendations.append(
-                "Es crucial buscar ayuda profesional de inmediato para un tratamiento adecuado y el apoyo necesario.")
-            self.recommendations.append(
-                "Evite el consumo de alcohol y drogas recreativas, ya que pueden empeorar los síntomas de la ansiedad.")
-            self.recommendations.append(
-                "Pruebe técnicas de manejo del estrés como el ejercicio regular, la meditación o el yoga.")
-            self.recommendations.append(
-                "Hable con su médico sobre la posibilidad de terapia cognitivo-conductual (TCC) o medicación para la ansiedad.")
-            self.recommendations.append(
-                "Considere la posibilidad de unirse a un grupo de apoyo o buscar terapia individual para obtener apoyo adicional.")
-            self.recommendations.append(
-                "Priorice el autocuidado y establezca límites saludables en su vida diaria para reducir el estrés.")
+            self.recommend('band_high')
+            self.recommend('high_avoid_substances')
+            self.recommend('high_stress_management')
+            self.recommend('high_cbt')
+            self.recommend('high_support_group')
+            self.recommend('high_self_care')
 
     def get_recommendations(self):
         return self.recommendations
@@ -1,20 +1,21 @@
-from supabaseConfig import get_supabase_client
+from metrics import SUPABASE_LATENCY
+from supabaseConfig import get_supabase_auth_client
 
-supabase = get_supabase_client()
 
-
-def register_user(email, password):
-    response = supabase.auth.sign_up({
-        'email': email,
-        'password': password,
-        'email_confirm': False,
-    })
+async def register_user(email, password):
+    with SUPABASE_LATENCY.time('sign_up'):
+        response = await get_supabase_auth_client().auth.sign_up({
+            'email': email,
+            'password': password,
+            'email_confirm': False,
+        })
     return response
 
 
-def login_user(email, password):
-    response = supabase.auth.sign_in_with_password({
-        'email': email,
-        'password': password,
-    })
+async def login_user(email, password):
+    with SUPABASE_LATENCY.time('sign_in'):
+        response = await get_supabase_auth_client().auth.sign_in_with_password({
+            'email': email,
+            'password': password,
+        })
     return response
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import sys
+
+from benchmarks import endToEnd, micro, startup
+from benchmarks.harness import compare, print_table, write_report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmarks for the analysis, quiz and session paths.')
+    parser.add_argument('--suite', choices=('micro', 'e2e', 'startup', 'all'), default='all')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON report to check for regressions against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative median slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    results = {}
+    if args.suite in ('micro', 'all'):
+        results.update(micro.run(args.iterations))
+    if args.suite in ('e2e', 'all'):
+        results.update(asyncio.run(endToEnd.run(args.iterations)))
+    if args.suite in ('startup', 'all'):
+        results.update(startup.run(args.iterations))
+
+    write_report(results, args.output)
+    print_table(results)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}:')
+            for line in regressions:
+                print('  ' + line)
+            return 1
+        print(f'\nNo regressions over {args.threshold:.0%} against {args.compare}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
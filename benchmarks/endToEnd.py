@@ -0,0 +1,104 @@
+import contextlib
+import os
+import tempfile
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from benchmarks.harness import measure_async
+from benchmarks.micro import sample_answers
+from benchmarks.supabaseStub import STUB_JWT_SECRET, STUB_USER, SupabaseStub
+
+BENCH_USER = STUB_USER['id']
+
+
+def _prepare_environment():
+    # Must run before main is imported: these modules read their settings at import time.
+    os.environ.setdefault('SUPABASE_URL', 'http://supabase.stub')
+    os.environ.setdefault('SUPABASE_KEY', 'stub-key')
+    os.environ.setdefault('SUPABASE_JWT_SECRET', STUB_JWT_SECRET)
+    # A background model build would compete with the measured requests.
+    os.environ.setdefault('MODEL_PRELOAD', 'eager')
+    # Local state goes to a scratch directory, never into the checkout.
+    directory = tempfile.mkdtemp(prefix='bench-')
+    os.environ['SESSION_JOURNAL_PATH'] = os.path.join(directory, 'journal.db')
+    os.environ['SESSION_DB_PATH'] = os.path.join(directory, 'sessions.db')
+    os.environ['ANALYTICS_DB_PATH'] = os.path.join(directory, 'analytics.db')
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(seed_sessions: int = 500) -> AsyncIterator[httpx.AsyncClient]:
+    # The app, started through its lifespan, behind an in-memory Supabase, with a client that
+    # calls it over ASGI (no sockets).
+    _prepare_environment()
+    import main
+    from supabaseConfig import set_supabase_transport
+
+    stub = SupabaseStub()
+    stub.seed(BENCH_USER, seed_sessions)
+    set_supabase_transport(stub.transport())
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            yield client
+
+
+async def run(iterations: int) -> Dict[str, Dict]:
+    async with in_process_client() as client:
+        from analysisCache import analysis_cache
+        from experts import conditions
+
+        results = {}
+        # Repeated identical requests would otherwise measure cache hits; see e2e.analyze.cached.
+        cache_size, analysis_cache.max_entries = analysis_cache.max_entries, 0
+
+        async def request(method: str, url: str, expected: int = 200, **kwargs):
+            response = await client.request(method, url, **kwargs)
+            if response.status_code != expected:
+                raise RuntimeError(f'{method} {url}: {response.status_code} {response.text[:200]}')
+            return response
+
+        for condition, (_, quiz) in conditions.items():
+            results[f'e2e.quiz.{condition}'] = await measure_async(
+                lambda: request('GET', f'/quiz/{condition}', headers={'accept-encoding': 'identity'}),
+                iterations)
+            body = {'condition': condition, 'answers': sample_answers(quiz)}
+            results[f'e2e.analyze.{condition}'] = await measure_async(
+                lambda: request('POST', '/analyze/', json=body), iterations)
+
+        etag = (await request('GET', '/quiz/stress', headers={'accept-encoding': 'gzip'})).headers['etag']
+        results['e2e.quiz.stress.gzip'] = await measure_async(
+            lambda: request('GET', '/quiz/stress', headers={'accept-encoding': 'gzip'}), iterations)
+        results['e2e.quiz.stress.not_modified'] = await measure_async(
+            lambda: request('GET', '/quiz/stress', 304,
+                            headers={'accept-encoding': 'gzip', 'if-none-match': etag}), iterations)
+
+        analysis_cache.max_entries = cache_size
+        body = {'condition': 'stress', 'answers': sample_answers(conditions['stress'][1])}
+        results['e2e.analyze.cached'] = await measure_async(
+            lambda: request('POST', '/analyze/', json=body), iterations)
+        analysis_cache.max_entries = 0
+
+        full = {'screening': sample_answers(conditions['screening'][1]),
+                'answers': {condition: sample_answers(quiz) for condition, (_, quiz) in conditions.items()
+                            if condition != 'screening'}}
+        results['e2e.analyze_full'] = await measure_async(
+            lambda: request('POST', '/analyze/full', json=full), iterations)
+
+        batch = [{'condition': condition, 'answers': sample_answers(quiz)}
+                 for condition, (_, quiz) in conditions.items() for _ in range(20)]
+        results[f'e2e.analyze_batch.{len(batch)}'] = await measure_async(
+            lambda: request('POST', '/analyze/batch', json=batch), max(iterations // 10, 3))
+
+        results['e2e.login'] = await measure_async(
+            lambda: request('POST', '/login/', json={'email': 'bench@example.com', 'password': 'x'}),
+            iterations)
+        login = await request('POST', '/login/', json={'email': 'bench@example.com', 'password': 'x'})
+        auth = {'authorization': f"Bearer {login.json()['session']['access_token']}"}
+        results['e2e.session.page'] = await measure_async(
+            lambda: request('GET', f'/session/{BENCH_USER}', headers=auth), iterations)
+        results['e2e.save_data'] = await measure_async(
+            lambda: request('POST', '/save_data/', 202, headers=auth,
+                            json={'to_save': ['a', 'b'], 'user_id': BENCH_USER}),
+            iterations)
+    return results
@@ -0,0 +1,90 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+def summarize(samples_ns: List[int]) -> Dict[str, float]:
+    samples = sorted(samples_ns)
+    median = statistics.median(samples)
+    return {
+        'runs': len(samples),
+        'min_us': samples[0] / 1e3,
+        'median_us': median / 1e3,
+        'mean_us': statistics.fmean(samples) / 1e3,
+        'p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))] / 1e3,
+        'ops_per_s': 1e9 / median if median else float('inf'),
+    }
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+async def measure_async(fn: Callable[[], Awaitable[object]], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        await fn()
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def metadata() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def write_report(results: Dict[str, Dict], path: Optional[str]):
+    report = {'meta': metadata(), 'results': results}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as output:
+            output.write(text + '\n')
+    return report
+
+
+def compare(results: Dict[str, Dict], baseline_path: str, threshold: float) -> List[str]:
+    # A benchmark regresses when its median is more than `threshold` (relative) slower than the
+    # baseline's. Benchmarks missing from either side are ignored.
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or not previous.get('median_us'):
+            continue
+        change = result['median_us'] / previous['median_us'] - 1
+        line = f"{name}: {previous['median_us']:.1f}us -> {result['median_us']:.1f}us ({change:+.1%})"
+        if change > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def print_table(results: Dict[str, Dict]):
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'median us':>11}  {'p95 us':>11}  {'ops/s':>11}")
+    for name, result in sorted(results.items()):
+        print(f"{name:<{width}}  {result['median_us']:>11.1f}  {result['p95_us']:>11.1f}  {result['ops_per_s']:>11.1f}")
+
@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+import jwt
+
+from benchmarks.harness import metadata
+
+# A corpus is a JSONL file with one request per line:
+#   {"method": "POST", "path": "/analyze/", "json": {...}, "headers": {...},
+#    "name": "analyze", "weight": 3, "auth": true, "expect": [200]}
+# Only method and path are required. Requests are reported under `name`, or else under the
+# method and the path as written (before placeholders are filled in). "{user_id}" in the path,
+# header values or body strings becomes the logged-in user's id; "auth" adds the bearer token.
+# Lines without a method and path (or that are not JSON objects) are skipped.
+
+
+class CorpusEntry(NamedTuple):
+    name: str
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: Any
+    auth: bool
+    expect: Optional[Tuple[int, ...]]
+
+
+class Outcome(NamedTuple):
+    name: str
+    status: str  # the HTTP status, or the exception's class name
+    ok: bool
+    latency_ns: int
+    steady: bool  # sent after the ramp-up; only these are reported
+
+
+def load_corpus(path: str) -> Tuple[List[CorpusEntry], int]:
+    entries, skipped = [], 0
+    with open(path) as corpus:
+        for line in corpus:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict) or 'method' not in record or 'path' not in record:
+                skipped += 1
+                continue
+            method = record['method'].upper()
+            expect = record.get('expect')
+            entry = CorpusEntry(record.get('name') or f"{method} {record['path'].split('?')[0]}", method,
+                                record['path'], record.get('headers') or {}, record.get('json'),
+                                bool(record.get('auth')), tuple(expect) if expect else None)
+            entries.extend([entry] * max(int(record.get('weight', 1)), 0))
+    return entries, skipped
+
+
+def substitute(value: Any, variables: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        for name, replacement in variables.items():
+            value = value.replace('{' + name + '}', replacement)
+        return value
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: substitute(item, variables) for key, item in value.items()}
+    return value
+
+
+def arrival_offset(index: int, rate: float, ramp_up: float) -> float:
+    # Time of the index-th arrival when the rate climbs linearly from 0 to `rate` over
+    # `ramp_up` seconds and then stays there (inverse of the cumulative arrival count).
+    ramp_arrivals = rate * ramp_up / 2
+    if index < ramp_arrivals:
+        return math.sqrt(2 * index * ramp_up / rate)
+    return ramp_up + (index - ramp_arrivals) / rate
+
+
+def percentile(samples: List[int], quantile: float) -> int:
+    # Nearest rank on already sorted samples.
+    return samples[max(0, min(len(samples) - 1, math.ceil(quantile * len(samples)) - 1))]
+
+
+class LoadTest:
+    # Sends the corpus, in file order and repeating it as needed, for `duration` seconds.
+    #
+    # open: requests start at a fixed arrival rate whether or not earlier ones have finished,
+    # the way independent users arrive; latency counts from the scheduled start, so a
+    # saturated server shows up as growing latency instead of a lower send rate. At most
+    # `max_in_flight` are outstanding; arrivals beyond that are recorded as 'dropped'.
+    # closed: `concurrency` clients each send their next request as soon as the previous one
+    # is answered, which measures the throughput the service sustains at that concurrency.
+    #
+    # Both ramp up linearly (the rate, or the number of clients) over `ramp_up` seconds;
+    # requests sent during the ramp-up are not reported.
+    def __init__(self, client: httpx.AsyncClient, entries: List[CorpusEntry], variables: Dict[str, str],
+                 token: Optional[str], timeout: float):
+        self.client = client
+        self.entries = entries
+        self.variables = variables
+        self.token = token
+        self.timeout = timeout
+        self.outcomes: List[Outcome] = []
+        self.next_entry: Iterator[CorpusEntry] = itertools.cycle(entries)
+        self.steady_from = 0.0
+
+    async def send(self, entry: CorpusEntry, scheduled: float):
+        headers = substitute(entry.headers, self.variables)
+        if entry.auth and self.token:
+            headers['authorization'] = f'Bearer {self.token}'
+        try:
+            response = await asyncio.wait_for(
+                self.client.request(entry.method, substitute(entry.path, self.variables), headers=headers,
+                                    json=substitute(entry.body, self.variables)),
+                self.timeout)
+            await response.aread()
+            status = str(response.status_code)
+            ok = response.status_code in entry.expect if entry.expect else response.status_code < 400
+        except asyncio.TimeoutError:
+            status, ok = 'timeout', False
+        except httpx.HTTPError as error:
+            status, ok = type(error).__name__, False
+        self.record(entry, status, ok, scheduled)
+
+    def record(self, entry: CorpusEntry, status: str, ok: bool, scheduled: float):
+        now = time.perf_counter()
+        self.outcomes.append(Outcome(entry.name, status, ok, int((now - scheduled) * 1e9),
+                                     scheduled >= self.steady_from))
+
+    async def open_loop(self, rate: float, duration: float, ramp_up: float, max_in_flight: int):
+        start = time.perf_counter()
+        self.steady_from = start + ramp_up
+        in_flight = set()
+        for index in itertools.count():
+            offset = arrival_offset(index, rate, ramp_up)
+            if offset >= duration:
+                break
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            entry = next(self.next_entry)
+            if len(in_flight) >= max_in_flight:
+                self.record(entry, 'dropped', False, scheduled)
+                continue
+            task = asyncio.create_task(self.send(entry, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        return time.perf_counter() - self.steady_from
+
+    async def closed_loop(self, concurrency: int, duration: float, ramp_up: float):
+        start = time.perf_counter()
+        self.steady_from = start + ramp_up
+        end = start + duration
+
+        async def client(index: int):
+            await asyncio.sleep(ramp_up * index / concurrency)
+            while True:
+                scheduled = time.perf_counter()
+                if scheduled >= end:
+                    return
+                await self.send(next(self.next_entry), scheduled)
+
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+        return time.perf_counter() - self.steady_from
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        groups: Dict[str, List[Outcome]] = {}
+        for outcome in self.outcomes:
+            if outcome.steady:
+                groups.setdefault(outcome.name, []).append(outcome)
+        report = {name: summarize_outcomes(outcomes, elapsed) for name, outcomes in sorted(groups.items())}
+        report['total'] = summarize_outcomes([outcome for outcomes in groups.values() for outcome in outcomes],
+                                             elapsed)
+        return report
+
+
+def summarize_outcomes(outcomes: List[Outcome], elapsed: float) -> Dict[str, Any]:
+    # Latency percentiles include failed requests: a shed or timed-out request is still a wait.
+    latencies = sorted(outcome.latency_ns for outcome in outcomes)
+    errors = sum(not outcome.ok for outcome in outcomes)
+    summary = {
+        'requests': len(outcomes),
+        'errors': errors,
+        'error_rate': errors / len(outcomes) if outcomes else 0.0,
+        'throughput_rps': (len(outcomes) - errors) / elapsed if elapsed > 0 else 0.0,
+        'statuses': dict(sorted(Counter(outcome.status for outcome in outcomes).items())),
+    }
+    for label, quantile in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0)):
+        summary[label] = percentile(latencies, quantile) / 1e6 if latencies else 0.0
+    return summary
+
+
+def print_report(report: Dict[str, Dict]):
+    width = max(len(name) for name in report)
+    print(f"{'endpoint':<{width}}  {'requests':>9}  {'ok/s':>9}  {'errors':>7}  "
+          f"{'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  statuses")
+    for name, row in report.items():
+        statuses = ' '.join(f'{status}:{count}' for status, count in row['statuses'].items())
+        print(f"{name:<{width}}  {row['requests']:>9}  {row['throughput_rps']:>9.1f}  {row['error_rate']:>7.2%}  "
+              f"{row['p50_ms']:>9.2f}  {row['p95_ms']:>9.2f}  {row['p99_ms']:>9.2f}  {statuses}")
+
+
+def sample_corpus(count: int, seed: int = 0) -> Iterator[Dict]:
+    # A mix shaped like a day's traffic: mostly quiz fetches and analyses with varied answers
+    # (so the analysis cache sees misses too), some full assessments, history reads and saves.
+    from experts import conditions
+
+    rng = random.Random(seed)
+
+    def answers(quiz) -> Dict:
+        return {question.fact: rng.randint(0, 4 * len(question.options)) if question.answer_mode == 3
+                else str(rng.randint(1, len(question.options))) for question in quiz.questions}
+
+    kinds = ['quiz'] * 4 + ['analyze'] * 4 + ['full', 'session', 'save']
+    for _ in range(count):
+        condition, (_, quiz) = rng.choice(list(conditions.items()))
+        kind = rng.choice(kinds)
+        if kind == 'quiz':
+            yield {'name': 'GET /quiz/{condition}', 'method': 'GET', 'path': f'/quiz/{condition}',
+                   'headers': {'accept-encoding': 'gzip'}}
+        elif kind == 'analyze':
+            yield {'method': 'POST', 'path': '/analyze/', 'json': {'condition': condition, 'answers': answers(quiz)}}
+        elif kind == 'full':
+            yield {'method': 'POST', 'path': '/analyze/full',
+                   'json': {'screening': answers(conditions['screening'][1]),
+                            'answers': {name: answers(other) for name, (_, other) in conditions.items()
+                                        if name != 'screening'}}}
+        elif kind == 'session':
+            yield {'method': 'GET', 'path': '/session/{user_id}?limit=20', 'auth': True}
+        else:
+            yield {'method': 'POST', 'path': '/save_data/', 'auth': True, 'expect': [202],
+                   'json': {'to_save': [condition], 'user_id': '{user_id}'}}
+
+
+async def log_in(client: httpx.AsyncClient, email: str, password: str) -> Tuple[str, str]:
+    response = await client.post('/login/', json={'email': email, 'password': password})
+    response.raise_for_status()
+    session = response.json()['session']
+    return session['access_token'], session['user']['id']
+
+
+async def run(args, entries: List[CorpusEntry]) -> Tuple[Dict[str, Dict], float]:
+    @contextlib.asynccontextmanager
+    async def target():
+        if args.url:
+            limit = args.concurrency if args.mode == 'closed' else args.max_in_flight
+            limits = httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+            async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+                yield client
+        else:
+            # Client and app share one event loop and core here, so this finds regressions;
+            # capacity numbers for a release come from --url against the deployed launcher.
+            from benchmarks.endToEnd import in_process_client
+            async with in_process_client() as client:
+                yield client
+
+    async with target() as client:
+        token, user_id = args.token, args.user_id
+        if any(entry.auth for entry in entries) and not token:
+            if args.url and not args.email:
+                raise SystemExit('the corpus needs a login: pass --token or --email/--password')
+            token, user_id = await log_in(client, args.email or 'bench@example.com', args.password or 'x')
+        if token and not user_id:
+            user_id = jwt.decode(token, options={'verify_signature': False}).get('sub')
+
+        load = LoadTest(client, entries, {'user_id': user_id or ''}, token, args.timeout)
+        if args.mode == 'open':
+            elapsed = await load.open_loop(args.rate, args.duration, args.ramp_up, args.max_in_flight)
+        else:
+            elapsed = await load.closed_loop(args.concurrency, args.duration, args.ramp_up)
+    return load.report(elapsed), elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadTest',
+                                     description='Replays a JSONL request corpus against the API and reports '
+                                                 'throughput, error rate and latency percentiles per endpoint.')
+    parser.add_argument('corpus', help='JSONL request file (or, with --write-sample, the file to create)')
+    parser.add_argument('--url', help='base URL of a running server; by default the app runs in-process '
+                                      'against an in-memory Supabase')
+    parser.add_argument('--mode', choices=('open', 'closed'), default='closed')
+    parser.add_argument('--rate', type=float, default=50, help='open mode: requests started per second')
+    parser.add_argument('--concurrency', type=int, default=8, help='closed mode: simultaneous clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds, ramp-up included')
+    parser.add_argument('--ramp-up', type=float, default=5)
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='open mode: outstanding request cap')
+    parser.add_argument('--timeout', type=float, default=30, help='per request, seconds')
+    parser.add_argument('--token', help='bearer token for "auth" requests')
+    parser.add_argument('--user-id', help='value for {user_id}; defaults to the token subject')
+    parser.add_argument('--email')
+    parser.add_argument('--password')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--max-error-rate', type=float, help='exit with 1 when the total error rate is above this')
+    parser.add_argument('--max-p99', type=float, metavar='MS', help='exit with 1 when the total p99 is above this')
+    parser.add_argument('--write-sample', type=int, metavar='COUNT',
+                        help='write a sample corpus of COUNT requests to the corpus path and exit')
+    args = parser.parse_args()
+
+    if args.write_sample:
+        with open(args.corpus, 'w') as corpus:
+            for record in sample_corpus(args.write_sample):
+                corpus.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return 0
+
+    if args.ramp_up >= args.duration:
+        parser.error('--ramp-up must be shorter than --duration')
+    entries, skipped = load_corpus(args.corpus)
+    if skipped:
+        print(f'{skipped} line(s) of {args.corpus} are not requests; skipped.', file=sys.stderr)
+    if not entries:
+        parser.error(f'{args.corpus} has no requests')
+
+    # In-process, the rule engines print their intermediate results; keep that out of the report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        report, elapsed = asyncio.run(run(args, entries))
+
+    print(f"{args.mode} loop, {args.url or 'in-process'}, {elapsed:.1f} s measured after {args.ramp_up:g} s ramp-up")
+    print_report(report)
+    if args.output:
+        settings = {key: value for key, value in vars(args).items() if key not in ('token', 'password')}
+        with open(args.output, 'w') as output:
+            json.dump({'meta': metadata(), 'settings': settings, 'results': report}, output, indent=2)
+            output.write('\n')
+
+    total = report['total']
+    failed = []
+    if args.max_error_rate is not None and total['error_rate'] > args.max_error_rate:
+        failed.append(f"error rate {total['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.max_p99 is not None and total['p99_ms'] > args.max_p99:
+        failed.append(f"p99 {total['p99_ms']:.1f} ms > {args.max_p99:g} ms")
+    if failed:
+        print('\nFailed: ' + '; '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
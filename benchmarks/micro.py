@@ -0,0 +1,81 @@
+import time
+from typing import Dict, List
+
+from answerCodec import codecs
+from benchmarks.harness import measure, summarize
+from dtos import Quiz
+from experts import conditions, get_expert
+from modelRegistry import get_marginals, get_model
+
+ENGINES = ('experta', 'compiled')
+
+
+def sample_answers(quiz: Quiz) -> Dict:
+    # First option everywhere (the "yes"/most-loaded answer), a mid-range score for numeric questions.
+    return {question.fact: 14 if question.answer_mode == 3 else '1' for question in quiz.questions}
+
+
+def bench_engine_stages(condition: str, engine: str, iterations: int) -> Dict[str, Dict]:
+    factory = get_expert(condition, engine)
+    answers = sample_answers(conditions[condition][1])
+    stages: Dict[str, List[int]] = {'construct': [], 'reset': [], 'input_data': [], 'run': []}
+    for iteration in range(iterations + 3):
+        start = time.perf_counter_ns()
+        expert = factory()
+        constructed = time.perf_counter_ns()
+        expert.reset()
+        reset = time.perf_counter_ns()
+        expert.input_data(answers)
+        declared = time.perf_counter_ns()
+        expert.run()
+        finished = time.perf_counter_ns()
+        if iteration < 3:
+            continue
+        stages['construct'].append(constructed - start)
+        stages['reset'].append(reset - constructed)
+        stages['input_data'].append(declared - reset)
+        stages['run'].append(finished - declared)
+    return {f'micro.{condition}.{engine}.{stage}': summarize(samples) for stage, samples in stages.items()}
+
+
+def bench_inference(condition: str, iterations: int) -> Dict[str, Dict]:
+    compiled = get_model(condition)
+    evidence = compiled.encode(sample_answers(conditions[condition][1]))
+    target = compiled.posterior.target
+    marginals = get_marginals(condition)
+    return {
+        f'micro.{condition}.pgmpy_query': measure(
+            lambda: compiled.inference.query(variables=[target], evidence=evidence, show_progress=False),
+            iterations),
+        f'micro.{condition}.posterior_lookup': measure(lambda: compiled.posterior.lookup(evidence), iterations),
+        f'micro.{condition}.sensitivity_pgmpy': measure(
+            lambda: [compiled.inference.query(variables=[target], evidence={**evidence, name: 1 - value},
+                                              show_progress=False) for name, value in evidence.items()],
+            iterations),
+        f'micro.{condition}.sensitivity_flips': measure(lambda: compiled.posterior.flips(evidence), iterations),
+        f'micro.{condition}.nodes_pgmpy': measure(
+            lambda: [compiled.inference.query(variables=[node], evidence=evidence, show_progress=False)
+                     for node in marginals.nodes], iterations),
+        f'micro.{condition}.nodes_lookup': measure(lambda: marginals.lookup(evidence), iterations),
+    }
+
+
+def bench_codec(condition: str, iterations: int) -> Dict[str, Dict]:
+    codec = codecs[condition]
+    answers = sample_answers(conditions[condition][1])
+    packed = codec.encode(answers)
+    return {
+        f'micro.{condition}.codec_encode': measure(lambda: codec.encode(answers), iterations),
+        f'micro.{condition}.codec_decode': measure(lambda: codec.decode(packed), iterations),
+    }
+
+
+def run(iterations: int) -> Dict[str, Dict]:
+    results = {}
+    for condition in conditions:
+        for engine in ENGINES:
+            results.update(bench_engine_stages(condition, engine, iterations))
+        results.update(bench_codec(condition, iterations))
+        if condition != "screening":
+            results.update(bench_inference(condition, iterations))
+    return results
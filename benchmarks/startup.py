@@ -0,0 +1,75 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.harness import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                          check=True)
+
+
+def import_costs(module: str = 'main') -> Tuple[int, List[Tuple[str, int, int]]]:
+    # Returns the total import time of `module` and, per top-level package, the summed
+    # self time plus the number of modules it loaded (microseconds, from `-X importtime`).
+    output = _python(f'import {module}', '-X', 'importtime').stderr
+    packages: Dict[str, List[int]] = {}
+    total = 0
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        if name == module and len(indent) == 1:
+            total = int(cumulative)
+        package = packages.setdefault(name.split('.')[0], [0, 0])
+        package[0] += int(own)
+        package[1] += 1
+    costs = sorted(((name, own, count) for name, (own, count) in packages.items()), key=lambda row: -row[1])
+    return total, costs
+
+
+def bench_process(code: str, iterations: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        _python(code)
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def run(iterations: int) -> Dict[str, Dict]:
+    # Every sample is a fresh interpreter, so keep the count well below the in-process suites'.
+    runs = max(iterations // 20, 3)
+    return {
+        'startup.import.main': bench_process('import main', runs),
+        'startup.build_models': bench_process('import experts, modelRegistry; modelRegistry.preload_models()', runs),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup',
+                                     description='Import cost per top-level package of a cold start.')
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    total, costs = import_costs(args.module)
+    print(f'import {args.module}: {total / 1e3:.1f} ms')
+    print(f"{'package':<30}  {'self ms':>9}  {'share':>6}  {'modules':>7}")
+    for name, own, count in costs[:args.top]:
+        share = own / total if total else 0
+        print(f'{name:<30}  {own / 1e3:>9.1f}  {share:>6.1%}  {count:>7}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+import jwt
+
+STUB_JWT_SECRET = 'stub-jwt-secret-for-local-benchmarks-only'
+
+STUB_USER = {
+    'id': '00000000-0000-0000-0000-000000000001',
+    'aud': 'authenticated',
+    'role': 'authenticated',
+    'email': 'bench@example.com',
+    'app_metadata': {},
+    'user_metadata': {},
+    'created_at': '2024-01-01T00:00:00Z',
+}
+
+
+class SupabaseStub:
+    # In-memory stand-in for the parts of PostgREST and GoTrue the service uses:
+    # `sessions` select/insert with eq/lt/lte/gt/order/limit and password sign-in/sign-up.
+    def __init__(self):
+        self.sessions: List[Dict] = []
+        self.lock = threading.Lock()
+
+    def seed(self, user_id: str, count: int, data: str = '[]'):
+        with self.lock:
+            for _ in range(count):
+                self._insert({'user_id': user_id, 'data': data})
+
+    def _insert(self, row: Dict) -> Dict:
+        row = {'id': len(self.sessions) + 1, 'created_at': '2024-01-01T00:00:00+00:00', **row}
+        self.sessions.append(row)
+        return row
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.startswith('/auth/v1/'):
+            return self._auth(request)
+        if path == '/rest/v1/sessions':
+            if request.method == 'GET':
+                return self._select(request)
+            if request.method == 'POST':
+                return self._insert_request(request)
+        return httpx.Response(404, json={'message': f'stub: {request.method} {path}'})
+
+    def _auth(self, request: httpx.Request) -> httpx.Response:
+        issuer = f'{request.url.scheme}://{request.url.host}/auth/v1'
+        session = {'access_token': access_token(issuer), 'token_type': 'bearer', 'expires_in': 3600,
+                   'expires_at': 4102444800, 'refresh_token': 'stub-refresh', 'user': STUB_USER}
+        return httpx.Response(200, json=session)
+
+    def _select(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        with self.lock:
+            rows = list(self.sessions)
+        for column, condition in params.multi_items():
+            if column in ('select', 'order', 'limit', 'offset'):
+                continue
+            operator, _, value = condition.partition('.')
+            rows = [row for row in rows if _compare(row.get(column), operator, value)]
+        order = params.get('order')
+        if order:
+            column, _, direction = order.partition('.')
+            rows.sort(key=lambda row: row[column], reverse=direction.startswith('desc'))
+        if 'limit' in params:
+            rows = rows[:int(params['limit'])]
+        columns = params.get('select', '*')
+        if columns != '*':
+            names = columns.split(',')
+            rows = [{name: row.get(name) for name in names} for row in rows]
+        return httpx.Response(200, json=rows)
+
+    def _insert_request(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        with self.lock:
+            rows = [self._insert(row) for row in (payload if isinstance(payload, list) else [payload])]
+        columns = request.url.params.get('select')
+        if columns and columns != '*':
+            names = columns.split(',')
+            rows = [{name: row.get(name) for name in names} for row in rows]
+        return httpx.Response(201, json=rows)
+
+
+def access_token(issuer: str, lifetime: int = 3600) -> str:
+    # HS256, like a project still on Supabase's legacy JWT secret.
+    claims = {'sub': STUB_USER['id'], 'aud': 'authenticated', 'role': 'authenticated', 'email': STUB_USER['email'],
+              'iss': issuer, 'exp': int(time.time()) + lifetime}
+    return jwt.encode(claims, STUB_JWT_SECRET, algorithm='HS256')
+
+
+def _compare(actual, operator: str, value: str) -> bool:
+    if operator == 'eq':
+        return str(actual) == value
+    if operator in ('lt', 'gt', 'lte'):
+        actual, value = float(actual), float(value)
+        if operator == 'lte':
+            return actual <= value
+        return actual < value if operator == 'lt' else actual > value
+    raise ValueError(f'stub: unsupported operator {operator}')
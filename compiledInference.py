@@ -0,0 +1,75 @@
+from functools import reduce
+from typing import TYPE_CHECKING, Dict, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from pgmpy.inference import VariableElimination
+    from pgmpy.models import BayesianNetwork
+
+# Largest joint distribution, in states, a MarginalTable is built from.
+MAX_JOINT_STATES = 1 << 20
+
+
+class PosteriorTable:
+    # P(target = 1 | evidence) for every binary evidence combination, indexed by bit pattern
+    # (bit i holds the value of evidence[i]).
+    def __init__(self, inference: 'VariableElimination', target: str, evidence: List[str]):
+        self.target = target
+        self.evidence = tuple(evidence)
+        values = np.empty(1 << len(self.evidence))
+        for index in range(values.size):
+            query = {name: (index >> bit) & 1 for bit, name in enumerate(self.evidence)}
+            values[index] = inference.query(variables=[target], evidence=query, show_progress=False).values[1]
+        values.flags.writeable = False
+        self.values = values
+        self.bits = 1 << np.arange(len(self.evidence))
+
+    def index(self, evidence: Dict[str, int]) -> int:
+        index = 0
+        for bit, name in enumerate(self.evidence):
+            index |= evidence[name] << bit
+        return index
+
+    def lookup(self, evidence: Dict[str, int]):
+        return self.values[self.index(evidence)]
+
+    def lookup_many(self, evidence: np.ndarray) -> np.ndarray:
+        # One row per case, columns ordered as self.evidence.
+        return self.values[evidence @ self.bits]
+
+    def flips(self, evidence: Dict[str, int]) -> np.ndarray:
+        # The posterior with each evidence variable flipped in turn, ordered as self.evidence:
+        # one gather over the table, as every flipped pattern is an XOR of the case's index.
+        return self.values[self.index(evidence) ^ self.bits]
+
+
+class MarginalTable:
+    # P(node | evidence) for every node outside the evidence, for every binary evidence
+    # combination, indexed like PosteriorTable. All of it comes from one sum-product pass over
+    # the network's joint distribution: a few thousand states for these models, where a
+    # junction tree pass per pattern would cost more than the whole table.
+    def __init__(self, model: 'BayesianNetwork', evidence: List[str]):
+        self.evidence = tuple(evidence)
+        self.bits = 1 << np.arange(len(self.evidence))
+        cardinalities = model.get_cardinality()
+        if np.prod([cardinalities[node] for node in model.nodes()], dtype=float) > MAX_JOINT_STATES:
+            raise ValueError("La red es demasiado grande para calcular sus marginales de una vez.")
+        joint = reduce(lambda left, right: left.product(right, inplace=False),
+                       (cpd.to_factor() for cpd in model.get_cpds()))
+        self.nodes = tuple(sorted(node for node in joint.variables if node not in self.evidence))
+        # Evidence axes go last-bit first, so flattening them in C order yields the pattern index.
+        order = list(reversed(self.evidence)) + list(self.nodes)
+        values = joint.values.transpose([joint.variables.index(node) for node in order])
+        values = values.reshape((1 << len(self.evidence),) + values.shape[len(self.evidence):])
+        hidden = tuple(range(1, values.ndim))
+        values = values / values.sum(axis=hidden, keepdims=True)
+        self.values: Dict[str, np.ndarray] = {}
+        for axis, node in enumerate(self.nodes, 1):
+            marginal = values.sum(axis=tuple(other for other in hidden if other != axis))
+            marginal.flags.writeable = False
+            self.values[node] = marginal
+
+    def lookup(self, evidence: Dict[str, int]) -> Dict[str, List[float]]:
+        index = int(np.dot([evidence[name] for name in self.evidence], self.bits))
+        return {node: self.values[node][index].tolist() for node in self.nodes}
@@ -0,0 +1,127 @@
+import threading
+from typing import Dict, List, Tuple, Type
+
+from experta import Fact, KnowledgeEngine
+from experta.rule import Rule
+
+# Attributes KnowledgeEngine.__init__/reset create for the Rete matcher and agenda.
+ENGINE_ATTRIBUTES = {'running', 'facts', 'agenda', 'matcher', 'strategy'}
+RUN_ATTRIBUTES = {'recommendations', 'diagnosis', 'precomputed_posterior', 'probability', 'band'}
+
+
+class CompiledChain:
+    # Straight-line evaluator for an expert whose rules form a fixed sequence: every rule matches
+    # one Fact(action=...) plus facts bound by name, and each step declares the next action.
+    # Rules are run in declaration order without building a Rete network or an agenda.
+    def __init__(self, expert_class: Type[KnowledgeEngine]):
+        self.expert_class = expert_class
+        self.rules: Dict[str, Tuple] = {}
+        for name in dir(expert_class):
+            rule = getattr(expert_class, name)
+            if isinstance(rule, Rule):
+                action, bindings = _compile_rule(rule)
+                if action in self.rules:
+                    raise ValueError(f"{expert_class.__name__}: more than one rule handles action '{action}'")
+                self.rules[action] = (rule._wrapped, bindings)
+
+        probe = expert_class()
+        self.template = {name: value for name, value in vars(probe).items()
+                         if name not in ENGINE_ATTRIBUTES | RUN_ATTRIBUTES}
+        self.initial_facts = [fact for deffacts in probe.get_deffacts() for fact in deffacts()]
+
+    def __call__(self) -> 'CompiledRun':
+        return CompiledRun(self)
+
+
+def _compile_rule(rule: Rule) -> Tuple[str, List[Tuple[str, str]]]:
+    action = None
+    bindings = []
+    for pattern in rule:
+        if not isinstance(pattern, Fact):
+            raise ValueError(f"{rule._wrapped.__qualname__}: only Fact patterns can be compiled")
+        keys = [key for key in pattern if not str(key).startswith('__')]
+        if keys == ['action'] and isinstance(pattern['action'], str):
+            action = pattern['action']
+        elif len(keys) == 1 and pattern.__bind__ is not None:
+            bindings.append((pattern.__bind__, keys[0]))
+        else:
+            raise ValueError(f"{rule._wrapped.__qualname__}: unsupported pattern {pattern!r}")
+    if action is None:
+        raise ValueError(f"{rule._wrapped.__qualname__}: rule has no action fact")
+    return action, bindings
+
+
+class CompiledRun:
+    def __init__(self, chain: CompiledChain):
+        self.chain = chain
+        self.reset()
+
+    def reset(self):
+        state = object.__new__(self.chain.expert_class)
+        state.__dict__.update(self.chain.template)
+        state.recommendations = []
+        state.diagnosis = []
+        state.precomputed_posterior = None
+        # Rules and input_data call self.declare; collect the facts instead of feeding a matcher.
+        state.declare = self._declare
+        self.state = state
+        self.facts: Dict[str, Fact] = {}
+        self.actions: List[str] = []
+        self.declared = set()
+        self._declare(*self.chain.initial_facts)
+
+    def _declare(self, *facts: Fact):
+        for fact in facts:
+            if 'action' in fact:
+                # experta also asserts a given action fact only once.
+                if fact['action'] not in self.declared:
+                    self.declared.add(fact['action'])
+                    self.actions.append(fact['action'])
+            else:
+                for key in fact:
+                    self.facts[key] = fact
+
+    @property
+    def precomputed_posterior(self):
+        return self.state.precomputed_posterior
+
+    @precomputed_posterior.setter
+    def precomputed_posterior(self, value):
+        self.state.precomputed_posterior = value
+
+    def input_data(self, input_json):
+        self.chain.expert_class.input_data(self.state, input_json)
+
+    def run(self):
+        while self.actions:
+            # Latest declaration first, like experta's default depth strategy.
+            rule = self.chain.rules.get(self.actions.pop())
+            if rule is None:
+                continue
+            function, bindings = rule
+            if all(key in self.facts for _, key in bindings):
+                function(self.state, **{name: self.facts[key] for name, key in bindings})
+
+    def get_recommendations(self):
+        return self.state.get_recommendations()
+
+    def get_diagnosis(self):
+        return self.state.get_diagnosis()
+
+    def get_result(self):
+        return self.state.get_result()
+
+
+_chains: Dict[type, CompiledChain] = {}
+_lock = threading.Lock()
+
+
+def get_compiled_expert(expert_class: Type[KnowledgeEngine]) -> CompiledChain:
+    chain = _chains.get(expert_class)
+    if chain is None:
+        with _lock:
+            chain = _chains.get(expert_class)
+            if chain is None:
+                chain = CompiledChain(expert_class)
+                _chains[expert_class] = chain
+    return chain
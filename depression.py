@@ -1,10 +1,14 @@
+import logging
+from typing import Dict
+
 from experta import *
-from pgmpy.models import BayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.inference import VariableElimination
 
 from dtos import Quiz, Question
-from entity import Expert
+from entity import Expert, fact_values
+from modelRegistry import register_model, get_model
+from resultCatalog import band_of, register_texts
+
+logger = logging.getLogger(__name__)
 
 depression_quiz = Quiz([
         Question(
@@ -51,57 +55,114 @@ depression_quiz = Quiz([
         )
     ])
 
-class DepressionExpertSystem(KnowledgeEngine):
+
+def build_depression_model():
+    from pgmpy.factors.discrete import TabularCPD
+    from pgmpy.models import BayesianNetwork
+
+    model = BayesianNetwork([
+        ('FactoresAmbientales', 'Depresion'),
+        ('Habitos', 'Depresion'),
+        ('CausasPsicologicas', 'Depresion'),
+        ('FactoresBiologicos', 'Depresion'),
+        ('CambiosHormonales', 'FactoresBiologicos'),
+        ('Medicación', 'FactoresBiologicos'),
+        ('Consecuencias', 'FactoresBiologicos'),
+        ('CausasFisiologicas', 'FactoresBiologicos')
+    ])
+
+    cpd_factores_ambientales = TabularCPD(variable='FactoresAmbientales', variable_card=2, values=[[0.9], [0.1]])
+    cpd_habitos = TabularCPD(variable='Habitos', variable_card=2, values=[[0.8], [0.2]])
+    cpd_causas_psicologicas = TabularCPD(variable='CausasPsicologicas', variable_card=2, values=[[0.7], [0.3]])
+    cpd_cambios_hormonales = TabularCPD(variable='CambiosHormonales', variable_card=2, values=[[0.85], [0.15]])
+    cpd_medicacion = TabularCPD(variable='Medicación', variable_card=2, values=[[0.6], [0.4]])
+    cpd_consecuencias = TabularCPD(variable='Consecuencias', variable_card=2, values=[[0.75], [0.25]])
+    cpd_causas_fisiologicas = TabularCPD(variable='CausasFisiologicas', variable_card=2, values=[[0.7], [0.3]])
+
+    cpd_factores_biologicos = TabularCPD(
+        variable='FactoresBiologicos', variable_card=2,
+        values=[
+            [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.7, 0.6, 0.5, 0.4, 0.6, 0.5, 0.4, 0.3],
+            [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.3, 0.4, 0.5, 0.6, 0.4, 0.5, 0.6, 0.7]
+        ],
+        evidence=['CambiosHormonales', 'Medicación', 'Consecuencias', 'CausasFisiologicas'],
+        evidence_card=[2, 2, 2, 2]
+    )
+
+    cpd_depresion = TabularCPD(
+        variable='Depresion', variable_card=2,
+        values=[
+            [0.9, 0.7, 0.5, 0.3, 0.7, 0.5, 0.3, 0.1, 0.5, 0.3, 0.1, 0.05, 0.3, 0.1, 0.05, 0.02],
+            [0.1, 0.3, 0.5, 0.7, 0.3, 0.5, 0.7, 0.9, 0.5, 0.7, 0.9, 0.95, 0.7, 0.9, 0.95, 0.98]
+        ],
+        evidence=['FactoresAmbientales', 'Habitos', 'CausasPsicologicas', 'FactoresBiologicos'],
+        evidence_card=[2, 2, 2, 2]
+    )
+
+    model.add_cpds(cpd_factores_ambientales, cpd_habitos, cpd_causas_psicologicas, cpd_cambios_hormonales,
+                   cpd_medicacion, cpd_consecuencias, cpd_causas_fisiologicas, cpd_factores_biologicos,
+                   cpd_depresion)
+    model.check_model()
+    return model
+
+
+depression_evidence = [
+    'FactoresAmbientales', 'Habitos', 'CausasPsicologicas', 'CambiosHormonales', 'Medicación',
+    'Consecuencias', 'CausasFisiologicas'
+]
+
+
+def encode_depression_evidence(answers) -> Dict[str, int]:
+    return {
+        'FactoresAmbientales': 1 if answers['factores_ambientales'] == '1' else 0,
+        'Habitos': 1 if answers['habitos'] == '1' else 0,
+        'CausasPsicologicas': 1 if answers['causas_psicologicas'] == '1' else 0,
+        'CambiosHormonales': 1 if answers['cambios_hormonales'] == '1' else 0,
+        'Medicación': 1 if answers['medicacion'] == '1' else 0,
+        'Consecuencias': 1 if answers['consecuencias'] == '1' else 0,
+        'CausasFisiologicas': 1 if answers['causas_fisiologicas'] == '1' else 0
+    }
+
+
+depression_texts = {
+    'environmental_factors': "Busque apoyo profesional.",
+    'habits': "Mejore sus hábitos de vida.",
+    'psychological_causes': "Considere la terapia cognitivo-conductual.",
+    'hormonal_changes': "Evalúe sus cambios hormonales con un profesional.",
+    'medication': "Revise sus medicamentos con un médico.",
+    'consequences': "Considere hablar con un terapeuta sobre las consecuencias significativas en su vida.",
+    'physiological_causes': "Consulte con un profesional de la salud para tratar las causas fisiológicas.",
+    'posterior': "Probabilidad calculada de depresión: {posterior}",
+    'band_low':
+        "Hable con un amigo o familiar de confianza sobre cómo se siente y busque actividades que le brinden placer y distracción.",
+    'band_moderate':
+        "Considere hablar con un profesional de la salud mental para obtener apoyo adicional y considerar la terapia cognitivo-conductual.",
+    'band_moderately_high':
+        "Es importante buscar ayuda profesional y considerar opciones de tratamiento, como la terapia y, posiblemente, la medicación.",
+    'band_high':
+        "Se recomienda encarecidamente buscar ayuda profesional de inmediato y considerar opciones de tratamiento intensivo, como la hospitalización o la terapia intensiva.",
+}
+
+
+register_model('depression', build_depression_model, 'Depresion', depression_evidence,
+               encode_depression_evidence)
+register_texts('depression', depression_texts, bands=('band_low', 'band_moderate', 'band_moderately_high', 'band_high'),
+               thresholds=(0.30, 0.40, 0.50, 0.60))
+
+
+class DepressionExpertSystem(Expert):
+    condition = 'depression'
+
     @DefFacts()
     def _initial_action(self):
         yield Fact(action="find_depression")
 
     def __init__(self):
         super().__init__()
-        self.model = BayesianNetwork([
-            ('FactoresAmbientales', 'Depresion'),
-            ('Habitos', 'Depresion'),
-            ('CausasPsicologicas', 'Depresion'),
-            ('FactoresBiologicos', 'Depresion'),
-            ('CambiosHormonales', 'FactoresBiologicos'),
-            ('Medicación', 'FactoresBiologicos'),
-            ('Consecuencias', 'FactoresBiologicos'),
-            ('CausasFisiologicas', 'FactoresBiologicos')
-        ])
-
-        cpd_factores_ambientales = TabularCPD(variable='FactoresAmbientales', variable_card=2, values=[[0.9], [0.1]])
-        cpd_habitos = TabularCPD(variable='Habitos', variable_card=2, values=[[0.8], [0.2]])
-        cpd_causas_psicologicas = TabularCPD(variable='CausasPsicologicas', variable_card=2, values=[[0.7], [0.3]])
-        cpd_cambios_hormonales = TabularCPD(variable='CambiosHormonales', variable_card=2, values=[[0.85], [0.15]])
-        cpd_medicacion = TabularCPD(variable='Medicación', variable_card=2, values=[[0.6], [0.4]])
-        cpd_consecuencias = TabularCPD(variable='Consecuencias', variable_card=2, values=[[0.75], [0.25]])
-        cpd_causas_fisiologicas = TabularCPD(variable='CausasFisiologicas', variable_card=2, values=[[0.7], [0.3]])
-
-        cpd_factores_biologicos = TabularCPD(
-            variable='FactoresBiologicos', variable_card=2,
-            values=[
-                [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.7, 0.6, 0.5, 0.4, 0.6, 0.5, 0.4, 0.3],
-                [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.3, 0.4, 0.5, 0.6, 0.4, 0.5, 0.6, 0.7]
-            ],
-            evidence=['CambiosHormonales', 'Medicación', 'Consecuencias', 'CausasFisiologicas'],
-            evidence_card=[2, 2, 2, 2]
-        )
-
-        cpd_depresion = TabularCPD(
-            variable='Depresion', variable_card=2,
-            values=[
-                [0.9, 0.7, 0.5, 0.3, 0.7, 0.5, 0.3, 0.1, 0.5, 0.3, 0.1, 0.05, 0.3, 0.1, 0.05, 0.02],
-                [0.1, 0.3, 0.5, 0.7, 0.3, 0.5, 0.7, 0.9, 0.5, 0.7, 0.9, 0.95, 0.7, 0.9, 0.95, 0.98]
-            ],
-            evidence=['FactoresAmbientales', 'Habitos', 'CausasPsicologicas', 'FactoresBiologicos'],
-            evidence_card=[2, 2, 2, 2]
-        )
-
-        self.model.add_cpds(cpd_factores_ambientales, cpd_habitos, cpd_causas_psicologicas, cpd_cambios_hormonales,
-                            cpd_medicacion, cpd_consecuencias, cpd_causas_fisiologicas, cpd_factores_biologicos,
-                            cpd_depresion)
-        self.model.check_model()
-        self.inference = VariableElimination(self.model)
+        compiled = get_model(self.condition)
+        self.model = compiled.model
+        self.inference = compiled.inference
+        self.posterior = compiled.posterior
         self.recommendations = []
         self.diagnosis = []
 
@@ -118,44 +179,43 @@ class DepressionExpertSystem(KnowledgeEngine):
     @Rule(Fact(action='process_factores_ambientales'), AS.factores_ambientales << Fact(factores_ambientales=W()))
     def process_factores_ambientales(self, factores_ambientales):
         if factores_ambientales['factores_ambientales'] == '1':
-            self.recommendations.append("Busque apoyo profesional.")
+            self.recommend('environmental_factors')
         self.declare(Fact(action='process_habitos'))
 
     @Rule(Fact(action='process_habitos'), AS.habitos << Fact(habitos=W()))
     def process_habitos(self, habitos):
         if habitos['habitos'] == '1':
-            self.recommendations.append("Mejore sus hábitos de vida.")
+            self.recommend('habits')
         self.declare(Fact(action='process_causas_psicologicas'))
 
     @Rule(Fact(action='process_causas_psicologicas'), AS.causas_psicologicas << Fact(causas_psicologicas=W()))
     def process_causas_psicologicas(self, causas_psicologicas):
         if causas_psicologicas['causas_psicologicas'] == '1':
-            self.recommendations.append("Considere la terapia cognitivo-conductual.")
+            self.recommend('psychological_causes')
         self.declare(Fact(action='process_cambios_hormonales'))
 
     @Rule(Fact(action='process_cambios_hormonales'), AS.cambios_hormonales << Fact(cambios_hormonales=W()))
     def process_cambios_hormonales(self, cambios_hormonales):
         if cambios_hormonales['cambios_hormonales'] == '1':
-            self.recommendations.append("Evalúe sus cambios hormonales con un profesional.")
+            self.recommend('hormonal_changes')
         self.declare(Fact(action='process_medicacion'))
 
     @Rule(Fact(action='process_medicacion'), AS.medicacion << Fact(medicacion=W()))
     def process_medicacion(self, medicacion):
         if medicacion['medicacion'] == '1':
-            self.recommendations.append("Revise sus medicamentos con un médico.")
+            self.recommend('medication')
         self.declare(Fact(action='process_consecuencias'))
 
     @Rule(Fact(action='process_consecuencias'), AS.consecuencias << Fact(consecuencias=W()))
     def process_consecuencias(self, consecuencias):
         if consecuencias['consecuencias'] == '1':
-            self.recommendations.append(
-                "Considere hablar con un terapeuta sobre las consecuencias significativas en su vida.")
+            self.recommend('consequences')
         self.declare(Fact(action='process_causas_fisiologicas'))
 
     @Rule(Fact(action='process_causas_fisiologicas'), AS.causas_fisiologicas << Fact(causas_fisiologicas=W()))
     def process_causas_fisiologicas(self, causas_fisiologicas):
         if causas_fisiologicas['causas_fisiologicas'] == '1':
-            self.recommendations.append("Consulte con un profesional de la salud para tratar las causas fisiológicas.")
+            self.recommend('physiological_causes')
         self.declare(Fact(action='evaluate_depression_risk'))
 
     @Rule(Fact(action='evaluate_depression_risk'),
@@ -168,34 +228,30 @@ class DepressionExpertSystem(KnowledgeEngine):
           AS.causas_fisiologicas << Fact(causas_fisiologicas=W()))
     def evaluate_depression_risk(self, factores_ambientales, habitos, causas_psicologicas, cambios_hormonales,
                                  medicacion, consecuencias, causas_fisiologicas):
-        evidence = {
-            'FactoresAmbientales': 1 if factores_ambientales['factores_ambientales'] == '1' else 0,
-            'Habitos': 1 if habitos['habitos'] == '1' else 0,
-            'CausasPsicologicas': 1 if causas_psicologicas['causas_psicologicas'] == '1' else 0,
-            'CambiosHormonales': 1 if cambios_hormonales['cambios_hormonales'] == '1' else 0,
-            'Medicación': 1 if medicacion['medicacion'] == '1' else 0,
-            'Consecuencias': 1 if consecuencias['consecuencias'] == '1' else 0,
-            'CausasFisiologicas': 1 if causas_fisiologicas['causas_fisiologicas'] == '1' else 0
-        }
-        prob_depresion = self.inference.query(variables=['Depresion'], evidence=evidence).values[1]
-        print("Probabilidad calculada de depresión:", prob_depresion)
-        self.recommendations.append(f"Probabilidad calculada de depresión: {prob_depresion}")
-
-        if 0.30 <= prob_depresion < 0.40:
+        evidence = encode_depression_evidence(fact_values(factores_ambientales, habitos, causas_psicologicas,
+                                                          cambios_hormonales, medicacion, consecuencias,
+                                                          causas_fisiologicas))
+        prob_depresion = self.posterior_of(evidence)
+        logger.debug("Probabilidad calculada de depresión: %s", prob_depresion)
+        self.probability = float(prob_depresion)
+        self.band = band_of(self.condition, prob_depresion)
+        self.recommend('posterior')
+
+        if self.band == 1:
             self.diagnosis.append("Su probabilidad de depresión está en un rango bajo.")
-            self.recommendations.append("Hable con un amigo o familiar de confianza sobre cómo se siente y busque actividades que le brinden placer y distracción.")
+            self.recommend('band_low')
 
-        elif 0.40 <= prob_depresion < 0.50:
+        elif self.band == 2:
             self.diagnosis.append("Su probabilidad de depresión es moderada.")
-            self.recommendations.append("Considere hablar con un profesional de la salud mental para obtener apoyo adicional y considerar la terapia cognitivo-conductual.")
+            self.recommend('band_moderate')
 
-        elif 0.50 <= prob_depresion < 0.60:
+        elif self.band == 3:
             self.diagnosis.append("Su probabilidad de depresión es moderadamente alta.")
-            self.recommendations.append("Es importante buscar ayuda profesional y considerar opciones de tratamiento, como la terapia y, posiblemente, la medicación.")
+            self.recommend('band_moderately_high')
 
-        elif prob_depresion >= 0.60:
+        elif self.band == 4:
             self.diagnosis.append("Su probabilidad de depresión es alta.")
-            self.recommendations.append("Se recomienda encarecidamente buscar ayuda profesional de inmediato y considerar opciones de tratamiento intensivo, como la hospitalización o la terapia intensiva.")
+            self.recommend('band_high')
 
     def get_recommendations(self):
         return self.recommendations
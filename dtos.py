@@ -1,23 +1,140 @@
-from typing import List, Dict, Union
-from pydantic import BaseModel
+from typing import List, Dict, NamedTuple, Optional, Tuple, Union
+from pydantic import BaseModel, model_validator
 
+# Bumped whenever the meaning of a stored result changes (codes renamed, bands redefined).
+RESULT_SCHEMA_VERSION = 1
 
-class Question:
-    def __init__(self, fact, statement: str, options: List[str], answer_mode: int):
-        self.statement = statement
-        self.options = options
-        self.answer_mode = answer_mode  # 1 unique - 2 multiple,
-        self.fact = fact
 
+class Question(NamedTuple):
+    fact: str
+    statement: str
+    options: List[str]
+    answer_mode: int  # 1 unique - 2 multiple,
 
-class Quiz:
-    def __init__(self, questions: List[Question]):
-        self.questions = questions
+    def as_json(self) -> Dict:
+        # Field order of the original wire format.
+        return {'statement': self.statement, 'options': self.options, 'answer_mode': self.answer_mode,
+                'fact': self.fact}
+
+
+class Quiz(NamedTuple):
+    questions: List[Question]
+
+    def as_json(self) -> Dict:
+        return {'questions': [question.as_json() for question in self.questions]}
+
+
+class AnalysisResult(NamedTuple):
+    # What an analysis produced, without its wording: the posterior of the condition node, the
+    # risk band it fell in (0 below the lowest band, None when there is no posterior) and the
+    # recommendation codes in order. resultCatalog turns codes into text. The screening's codes
+    # are the names of the conditions it flagged.
+    condition: str
+    posterior: Optional[float]
+    band: Optional[int]
+    codes: Tuple[str, ...]
+
+    def as_json(self) -> Dict:
+        return {'v': RESULT_SCHEMA_VERSION, 'condition': self.condition, 'posterior': self.posterior,
+                'band': self.band, 'codes': list(self.codes)}
+
+
+class FactorSensitivity(NamedTuple):
+    # The condition's posterior had evidence variable `factor`, now `value`, taken the other value.
+    factor: str
+    value: int
+    posterior: float
+    delta: float
+
+
+class NodePosteriors(NamedTuple):
+    # The distribution of every network node the answers leave unobserved, by state index.
+    condition: str
+    evidence: Dict[str, int]
+    marginals: Dict[str, List[float]]
+
+    def as_json(self) -> Dict:
+        return self._asdict()
+
+
+class SensitivityResult(NamedTuple):
+    condition: str
+    posterior: float
+    factors: Tuple[FactorSensitivity, ...]  # largest absolute delta first
+
+    def as_json(self) -> Dict:
+        return {'condition': self.condition, 'posterior': self.posterior,
+                'factors': [factor._asdict() for factor in self.factors]}
+
+
+class QuestionSchema(BaseModel):
+    statement: str
+    options: List[str]
+    answer_mode: int
+    fact: str
+
+
+class QuizSchema(BaseModel):
+    questions: List[QuestionSchema]
+
+
+Answers = Dict[str, Union[str, int, List[str]]]
 
 
 class QuizAnswers(BaseModel):
     condition: str
-    answers: Dict[str, Union[str, int]]
+    # Either the answers, or `packed`: their answerCodec form as URL-safe base64.
+    answers: Answers = {}
+    packed: Optional[str] = None
+
+    @model_validator(mode='after')
+    def one_answer_form(self):
+        if ('answers' in self.model_fields_set) == (self.packed is not None):
+            raise ValueError("Indique exactamente uno de 'answers' o 'packed'.")
+        return self
+
+
+class FullAssessment(BaseModel):
+    # Each questionnaire is an answers object or a packed string.
+    screening: Union[Answers, str]
+    answers: Dict[str, Union[Answers, str]]
+
+
+class NodePosteriorsSchema(BaseModel):
+    condition: str
+    evidence: Dict[str, int]
+    marginals: Dict[str, List[float]]
+
+
+class AnalysisResultSchema(BaseModel):
+    v: int = RESULT_SCHEMA_VERSION
+    condition: str
+    posterior: Optional[float] = None
+    band: Optional[int] = None
+    codes: List[str]
+
+
+class FactorSensitivitySchema(BaseModel):
+    factor: str
+    value: int
+    posterior: float
+    delta: float
+
+
+class SensitivityResultSchema(BaseModel):
+    condition: str
+    posterior: float
+    factors: List[FactorSensitivitySchema]
+
+
+class FullAssessmentResult(BaseModel):
+    diagnosis: List[str]
+    recommendations: List[str]
+
+
+class FullAssessmentCompactResult(BaseModel):
+    diagnosis: List[str]
+    results: List[AnalysisResultSchema]
 
 
 class AuthDto(BaseModel):
@@ -26,5 +143,14 @@ class AuthDto(BaseModel):
 
 
 class SessionData(BaseModel):
-    to_save: List[str]
+    # Compact results, or the rendered texts older clients send.
+    to_save: Union[List[AnalysisResultSchema], List[str]]
     user_id: str
+
+
+class SessionRecord(BaseModel):
+    # Only the requested columns are present; `id` always is.
+    id: int
+    created_at: Optional[str] = None
+    user_id: Optional[str] = None
+    data: Optional[str] = None
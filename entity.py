@@ -1,10 +1,25 @@
 from typing import Dict
 
 from experta import KnowledgeEngine
-from abc import ABC, abstractmethod
+from abc import abstractmethod
+
+from dtos import AnalysisResult
+from metrics import ANALYSIS_STAGE_LATENCY
+
+
+def fact_values(*facts) -> Dict:
+    values = {}
+    for fact in facts:
+        values.update(fact)
+    return values
 
 
 class Expert(KnowledgeEngine):
+    condition: str
+    precomputed_posterior = None
+    probability = None
+    band = None
+
     @abstractmethod
     def input_data(self, input_json):
         pass
@@ -12,3 +27,24 @@ class Expert(KnowledgeEngine):
     @abstractmethod
     def get_recommendations(self) -> Dict[str, str]:
         pass
+
+    def reset(self, **kwargs):
+        # Lets a single engine be reused across several analyses.
+        super().reset(**kwargs)
+        self.recommendations = []
+        self.diagnosis = []
+        self.precomputed_posterior = None
+        self.probability = None
+        self.band = None
+
+    def recommend(self, code: str):
+        self.recommendations.append(code)
+
+    def get_result(self) -> AnalysisResult:
+        return AnalysisResult(self.condition, self.probability, self.band, tuple(self.get_recommendations()))
+
+    def posterior_of(self, evidence: Dict[str, int]):
+        if self.precomputed_posterior is not None:
+            return self.precomputed_posterior
+        with ANALYSIS_STAGE_LATENCY.time(self.condition, 'inference'):
+            return self.posterior.lookup(evidence)
@@ -1,14 +1,26 @@
-from typing import Dict, Tuple
+import os
+import time
+from typing import Dict, List, Tuple
 
-from dtos import Quiz, QuizAnswers
+import numpy as np
+from dotenv import load_dotenv
+
+from dtos import FactorSensitivity, NodePosteriors, Quiz, QuizAnswers, SensitivityResult
 from anxiety import AnxietyExpertSystem, anxiety_quiz
 from depression import DepressionExpertSystem, depression_quiz
+from compiledRules import get_compiled_expert
 from entity import Expert
+from metrics import ANALYSIS_LATENCY, ANALYSIS_STAGE_LATENCY
+from modelRegistry import get_marginals, get_model
 from insomnia import InsomniaExpertSystem, insomnia_quiz
 from stress import StressExpertSystem, stress_quiz
 from unifiedSystem import UnifiedExpertSystem, screening_quiz
 
-# lock = threading.Lock()
+load_dotenv()
+
+# 'experta' runs the rule chain on the experta engine, 'compiled' on the straight-line evaluator.
+ANALYSIS_ENGINE = os.getenv('ANALYSIS_ENGINE', 'experta')
+
 # : Dict[str, Tuple[Expert, Quiz]]
 conditions = {
     "screening": (UnifiedExpertSystem, screening_quiz),
@@ -23,18 +35,75 @@ def get_quiz(condition: str) -> Quiz:
     return conditions[condition][1]
 
 
-def get_expert(condition: str):
-    return conditions[condition][0]
+def get_expert(condition: str, engine: str = ANALYSIS_ENGINE):
+    expert_class = conditions[condition][0]
+    if engine == 'compiled':
+        return get_compiled_expert(expert_class)
+    return expert_class
 
 
 def get_analysis(answer: QuizAnswers):
-    expert_class = get_expert(answer.condition)
-    expert = expert_class()
+    condition = answer.condition
+    expert_class = get_expert(condition)
+    with ANALYSIS_LATENCY.time(condition):
+        with ANALYSIS_STAGE_LATENCY.time(condition, 'construct'):
+            expert = expert_class()
+            expert.reset()
+        with ANALYSIS_STAGE_LATENCY.time(condition, 'declare'):
+            expert.input_data(answer.answers)
+        with ANALYSIS_STAGE_LATENCY.time(condition, 'rules'):
+            expert.run()
+
+    return expert.get_result()
+
+
+def get_batch_analysis(answers: List[QuizAnswers]):
+    results = [None] * len(answers)
+    groups: Dict[str, List[int]] = {}
+    for position, answer in enumerate(answers):
+        groups.setdefault(answer.condition, []).append(position)
+
+    for condition, positions in groups.items():
+        expert_class = get_expert(condition)
+        with ANALYSIS_STAGE_LATENCY.time(condition, 'construct'):
+            expert = expert_class()
+        posteriors = None
+        if condition != "screening":
+            with ANALYSIS_STAGE_LATENCY.time(condition, 'inference'):
+                compiled = get_model(condition)
+                encoded = [compiled.encode(answers[position].answers) for position in positions]
+                evidence = np.array([[row[name] for name in compiled.posterior.evidence] for row in encoded],
+                                    dtype=np.int64)
+                posteriors = compiled.posterior.lookup_many(evidence)
+
+        for row, position in enumerate(positions):
+            start = time.perf_counter()
+            expert.reset()
+            if posteriors is not None:
+                expert.precomputed_posterior = posteriors[row]
+            expert.input_data(answers[position].answers)
+            expert.run()
+            ANALYSIS_LATENCY.observe(time.perf_counter() - start, condition)
+            results[position] = expert.get_result()
+    return results
+
+
+def get_sensitivity(answer: QuizAnswers) -> SensitivityResult:
+    # What-if analysis: the posterior with each evidence variable flipped on its own, every flip
+    # read from the posterior table in one vectorized lookup.
+    compiled = get_model(answer.condition)
+    table = compiled.posterior
+    evidence = compiled.encode(answer.answers)
+    posterior = float(table.lookup(evidence))
+    flipped = table.flips(evidence)
+    deltas = flipped - posterior
+    factors = tuple(FactorSensitivity(table.evidence[index], evidence[table.evidence[index]], float(flipped[index]),
+                                      float(deltas[index]))
+                    for index in np.argsort(-np.abs(deltas), kind='stable'))
+    return SensitivityResult(answer.condition, posterior, factors)
 
-    expert.reset()
-    expert.input_data(answer.answers)
-    expert.run()
 
-    if answer.condition == "screening":
-        return expert.get_diagnosis()
-    return expert.get_recommendations()
+def get_node_posteriors(answer: QuizAnswers) -> NodePosteriors:
+    compiled = get_model(answer.condition)
+    evidence = compiled.encode(answer.answers)
+    return NodePosteriors(answer.condition, evidence, get_marginals(answer.condition).lookup(evidence))
@@ -1,8 +1,48 @@
-from supabaseConfig import get_supabase_client
+from typing import AsyncIterator, List, Optional
 
-supabase = get_supabase_client()
+import orjson
 
+from sessionStore import SESSION_COLUMNS, session_store
 
-def get_user_sessions(user_id):
-    response = supabase.table('sessions').select('*').eq('user_id', user_id).execute()
-    return response.data
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def session_columns(fields: Optional[str]) -> str:
+    if not fields:
+        return '*'
+    columns = [column.strip() for column in fields.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in SESSION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+    # The id is the pagination cursor, so it is always returned.
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    return ','.join(columns)
+
+
+async def get_user_sessions(user_id, limit: int = DEFAULT_PAGE_SIZE, before: Optional[int] = None,
+                            since: Optional[int] = None, columns: str = '*') -> List[dict]:
+    return await session_store.select(user_id, limit, before, since, columns)
+
+
+def next_cursor(sessions: List[dict], limit: int) -> Optional[int]:
+    if len(sessions) < limit:
+        return None
+    return sessions[-1]['id']
+
+
+async def stream_user_sessions(user_id, limit: int = DEFAULT_PAGE_SIZE, before: Optional[int] = None,
+                               since: Optional[int] = None, columns: str = '*') -> AsyncIterator[bytes]:
+    while True:
+        sessions = await get_user_sessions(user_id, limit, before, since, columns)
+        if sessions:
+            # One chunk per page rather than per row.
+            yield b''.join([orjson.dumps(row) + b'\n' for row in sessions])
+        cursor = next_cursor(sessions, limit)
+        if cursor is None:
+            return
+        if since is not None:
+            since = cursor
+        else:
+            before = cursor
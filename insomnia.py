@@ -1,10 +1,14 @@
+import logging
+from typing import Dict
+
 from experta import *
-from pgmpy.models import BayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.inference import VariableElimination
 
 from dtos import Quiz, Question
-from entity import Expert
+from entity import Expert, fact_values
+from modelRegistry import register_model, get_model
+from resultCatalog import band_of, register_texts
+
+logger = logging.getLogger(__name__)
 
 insomnia_quiz = Quiz([
         Question(
@@ -65,7 +69,97 @@ insomnia_quiz = Quiz([
             1,
         )
     ])
-class InsomniaExpertSystem(KnowledgeEngine):
+
+
+def build_insomnia_model():
+    from pgmpy.factors.discrete import TabularCPD
+    from pgmpy.models import BayesianNetwork
+
+    model = BayesianNetwork([
+        ('SleepEnvironment', 'Insomnia'),
+        ('CaffeineUse', 'Insomnia'),
+        ('MedicationUse', 'Insomnia'),
+        ('PsychologicalIssues', 'Insomnia')
+    ])
+
+    cpd_sleep_environment = TabularCPD(variable='SleepEnvironment', variable_card=2, values=[[0.8], [0.2]])
+    cpd_caffeine_use = TabularCPD(variable='CaffeineUse', variable_card=2, values=[[0.7], [0.3]])
+    cpd_medication_use = TabularCPD(variable='MedicationUse', variable_card=2, values=[[0.9], [0.1]])
+    cpd_psychological_issues = TabularCPD(variable='PsychologicalIssues', variable_card=2, values=[[0.6], [0.4]])
+
+    cpd_insomnia = TabularCPD(
+        variable='Insomnia', variable_card=2,
+        values=[
+            [0.9, 0.7, 0.8, 0.6, 0.75, 0.55, 0.65, 0.45, 0.7, 0.5, 0.6, 0.4, 0.5, 0.3, 0.4, 0.2],  # No Insomnia
+            [0.1, 0.3, 0.2, 0.4, 0.25, 0.45, 0.35, 0.55, 0.3, 0.5, 0.4, 0.6, 0.5, 0.7, 0.6, 0.8]  # Insomnia
+        ],
+        evidence=['SleepEnvironment', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'],
+        evidence_card=[2, 2, 2, 2]
+    )
+
+    model.add_cpds(cpd_sleep_environment, cpd_caffeine_use, cpd_medication_use, cpd_psychological_issues,
+                   cpd_insomnia)
+    model.check_model()
+    return model
+
+
+insomnia_evidence = [
+    'SleepEnvironment', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'
+]
+
+
+def encode_insomnia_evidence(answers) -> Dict[str, int]:
+    return {
+        'SleepEnvironment': 0 if answers['sleep_environment'] == '1' else 1,
+        'CaffeineUse': 0 if answers['lifestyle_factor'] != '1' else 1,
+        'MedicationUse': 0 if answers['medication_use'] == '5' else 1,
+        'PsychologicalIssues': 0 if answers['psychological_cause'] == '4' else 1
+    }
+
+
+insomnia_texts = {
+    'isi_none': "Interpretación: Insomnio sin significancia clínica.",
+    'isi_subthreshold': "Interpretación: Insomnio subumbral.",
+    'isi_moderate': "Interpretación: Insomnio moderado.",
+    'isi_severe': "Interpretación: Insomnio severo.",
+    'medical_condition': "Consulte con un profesional de la salud para tratar la condición médica subyacente.",
+    'review_medication': "Revise los medicamentos con su médico para ver si pueden estar afectando su sueño.",
+    'stress_techniques': "Considere técnicas de manejo del estrés como mindfulness y respiración profunda.",
+    'anxiety_cbt': "La terapia cognitivo-conductual puede ser útil para manejar la ansiedad.",
+    'depression_therapy': "Considere hablar con un terapeuta sobre opciones de tratamiento para la depresión.",
+    'avoid_stimulants': "Evite consumir cafeína, nicotina o alcohol antes de dormir.",
+    'avoid_heavy_meals': "Intente evitar comidas pesadas antes de acostarse.",
+    'exercise': "Incorpore ejercicio regular en su rutina diaria.",
+    'avoid_screens': "Evite el uso de dispositivos electrónicos al menos una hora antes de dormir.",
+    'sleep_environment':
+        "Asegúrese de que su entorno de sueño sea cómodo y propicio para dormir (sin ruido, luz y temperatura adecuadas).",
+    'posterior': "Probabilidad calculada de insomnio: {posterior}",
+    'band_moderate':
+        "Considere mejorar su higiene del sueño, como mantener un horario regular de sueño y evitar la cafeína y la nicotina antes de acostarse.",
+    'band_moderately_high':
+        "Además de mejorar su higiene del sueño, considere practicar técnicas de relajación antes de acostarse, como meditación o respiración profunda.",
+    'band_high':
+        "Junto con mejorar su higiene del sueño y practicar técnicas de relajación, considere buscar ayuda profesional para evaluar y abordar cualquier condición subyacente que pueda estar contribuyendo a su insomnio.",
+    'band_very_high':
+        "Es altamente recomendable que busque ayuda profesional de un médico o especialista en trastornos del sueño para una evaluación y tratamiento adecuados.",
+    'see_professional':
+        "Recomendamos que consulte a un profesional de la salud para un diagnóstico y tratamiento más detallado.",
+    'general_practices': "Puede considerar implementar las siguientes prácticas generales:",
+    'practice_routine': "- Mantener una rutina regular para dormir.",
+    'practice_screens': "- Evitar el uso de dispositivos electrónicos antes de dormir.",
+    'practice_sleep_environment': "- Crear un ambiente de sueño adecuado.",
+    'practice_relaxation': "- Practicar técnicas de relajación antes de acostarse.",
+}
+
+
+register_model('insomnia', build_insomnia_model, 'Insomnia', insomnia_evidence, encode_insomnia_evidence)
+register_texts('insomnia', insomnia_texts, bands=('band_moderate', 'band_moderately_high', 'band_high', 'band_very_high'),
+               thresholds=(0.40, 0.50, 0.60, 0.70))
+
+
+class InsomniaExpertSystem(Expert):
+    condition = 'insomnia'
+
     @DefFacts()
     def _initial_action(self):
         yield Fact(action='start')
@@ -73,32 +167,10 @@ class InsomniaExpertSystem(KnowledgeEngine):
 
     def __init__(self):
         super().__init__()
-        self.model = BayesianNetwork([
-            ('SleepEnvironment', 'Insomnia'),
-            ('CaffeineUse', 'Insomnia'),
-            ('MedicationUse', 'Insomnia'),
-            ('PsychologicalIssues', 'Insomnia')
-        ])
-
-        cpd_sleep_environment = TabularCPD(variable='SleepEnvironment', variable_card=2, values=[[0.8], [0.2]])
-        cpd_caffeine_use = TabularCPD(variable='CaffeineUse', variable_card=2, values=[[0.7], [0.3]])
-        cpd_medication_use = TabularCPD(variable='MedicationUse', variable_card=2, values=[[0.9], [0.1]])
-        cpd_psychological_issues = TabularCPD(variable='PsychologicalIssues', variable_card=2, values=[[0.6], [0.4]])
-
-        cpd_insomnia = TabularCPD(
-            variable='Insomnia', variable_card=2,
-            values=[
-                [0.9, 0.7, 0.8, 0.6, 0.75, 0.55, 0.65, 0.45, 0.7, 0.5, 0.6, 0.4, 0.5, 0.3, 0.4, 0.2],  # No Insomnia
-                [0.1, 0.3, 0.2, 0.4, 0.25, 0.45, 0.35, 0.55, 0.3, 0.5, 0.4, 0.6, 0.5, 0.7, 0.6, 0.8]  # Insomnia
-            ],
-            evidence=['SleepEnvironment', 'CaffeineUse', 'MedicationUse', 'PsychologicalIssues'],
-            evidence_card=[2, 2, 2, 2]
-        )
-
-        self.model.add_cpds(cpd_sleep_environment, cpd_caffeine_use, cpd_medication_use, cpd_psychological_issues,
-                            cpd_insomnia)
-        self.model.check_model()
-        self.inference = VariableElimination(self.model)
+        compiled = get_model(self.condition)
+        self.model = compiled.model
+        self.inference = compiled.inference
+        self.posterior = compiled.posterior
         self.recommendations = []
         self.diagnosis = []
 
@@ -115,71 +187,68 @@ class InsomniaExpertSystem(KnowledgeEngine):
 
     @Rule(Fact(action='process_difficulty_sleep'), AS.difficulty_sleep << Fact(difficulty_sleep=W()))
     def process_difficulty_sleep(self, difficulty_sleep):
-        print("Problema para dormir:", difficulty_sleep['difficulty_sleep'])
+        logger.debug("Problema para dormir: %s", difficulty_sleep['difficulty_sleep'])
         self.declare(Fact(action='process_daytime_consequence'))
 
     @Rule(Fact(action='process_daytime_consequence'), AS.daytime_consequence << Fact(daytime_consequence=W()))
     def process_daytime_consequence(self, daytime_consequence):
-        print("Consecuencia diurna más frecuente:", daytime_consequence['daytime_consequence'])
+        logger.debug("Consecuencia diurna más frecuente: %s", daytime_consequence['daytime_consequence'])
         self.declare(Fact(action='process_isi_score'))
 
     @Rule(Fact(action='process_isi_score'), AS.isi_score << Fact(isi_score=W()))
     def process_isi_score(self, isi_score):
         score = isi_score['isi_score']
-        print("Puntuación de ISI:", score)
+        logger.debug("Puntuación de ISI: %s", score)
         if score <= 7:
-            self.recommendations.append("Interpretación: Insomnio sin significancia clínica.")
+            self.recommend('isi_none')
         elif score <= 14:
-            self.recommendations.append("Interpretación: Insomnio subumbral.")
+            self.recommend('isi_subthreshold')
         elif score <= 21:
-            self.recommendations.append("Interpretación: Insomnio moderado.")
+            self.recommend('isi_moderate')
         else:
-            self.recommendations.append("Interpretación: Insomnio severo.")
+            self.recommend('isi_severe')
         self.declare(Fact(action='process_medical_cause'))
 
     @Rule(Fact(action='process_medical_cause'), AS.medical_cause << Fact(medical_cause=W()))
     def process_medical_cause(self, medical_cause):
         if medical_cause['medical_cause'] != '5':
-            self.recommendations.append("Consulte con un profesional de la salud para tratar la condición médica subyacente.")
+            self.recommend('medical_condition')
         self.declare(Fact(action='process_medication_use'))
 
     @Rule(Fact(action='process_medication_use'), AS.medication_use << Fact(medication_use=W()))
     def process_medication_use(self, medication_use):
         if medication_use['medication_use'] != '5':
-            self.recommendations.append("Revise los medicamentos con su médico para ver si pueden estar afectando su sueño.")
+            self.recommend('review_medication')
         self.declare(Fact(action='process_psychological_cause'))
 
     @Rule(Fact(action='process_psychological_cause'), AS.psychological_cause << Fact(psychological_cause=W()))
     def process_psychological_cause(self, psychological_cause):
         if psychological_cause['psychological_cause'] != '4':
             if psychological_cause['psychological_cause'] == '1':
-                self.recommendations.append(
-                    "Considere técnicas de manejo del estrés como mindfulness y respiración profunda.")
+                self.recommend('stress_techniques')
             elif psychological_cause['psychological_cause'] == '2':
-                self.recommendations.append("La terapia cognitivo-conductual puede ser útil para manejar la ansiedad.")
+                self.recommend('anxiety_cbt')
             elif psychological_cause['psychological_cause'] == '3':
-                self.recommendations.append(
-                    "Considere hablar con un terapeuta sobre opciones de tratamiento para la depresión.")
+                self.recommend('depression_therapy')
         self.declare(Fact(action='process_lifestyle_factor'))
 
     @Rule(Fact(action='process_lifestyle_factor'), AS.lifestyle_factor << Fact(lifestyle_factor=W()))
     def process_lifestyle_factor(self, lifestyle_factor):
         if lifestyle_factor['lifestyle_factor'] != '5':
             if lifestyle_factor['lifestyle_factor'] == '1':
-                self.recommendations.append("Evite consumir cafeína, nicotina o alcohol antes de dormir.")
+                self.recommend('avoid_stimulants')
             elif lifestyle_factor['lifestyle_factor'] == '2':
-                self.recommendations.append("Intente evitar comidas pesadas antes de acostarse.")
+                self.recommend('avoid_heavy_meals')
             elif lifestyle_factor['lifestyle_factor'] == '3':
-                self.recommendations.append("Incorpore ejercicio regular en su rutina diaria.")
+                self.recommend('exercise')
             elif lifestyle_factor['lifestyle_factor'] == '4':
-                self.recommendations.append(
-                    "Evite el uso de dispositivos electrónicos al menos una hora antes de dormir.")
+                self.recommend('avoid_screens')
         self.declare(Fact(action='process_sleep_environment'))
 
     @Rule(Fact(action='process_sleep_environment'), AS.sleep_environment << Fact(sleep_environment=W()))
     def process_sleep_environment(self, sleep_environment):
         if sleep_environment['sleep_environment'] != '1':
-            self.recommendations.append("Asegúrese de que su entorno de sueño sea cómodo y propicio para dormir (sin ruido, luz y temperatura adecuadas).")
+            self.recommend('sleep_environment')
         self.declare(Fact(action='evaluate_insomnia_risk'))
 
     @Rule(Fact(action='evaluate_insomnia_risk'),
@@ -188,35 +257,28 @@ class InsomniaExpertSystem(KnowledgeEngine):
           AS.medication_use << Fact(medication_use=W()),
           AS.psychological_cause << Fact(psychological_cause=W()))
     def evaluate_insomnia_risk(self, sleep_environment, lifestyle_factor, medication_use, psychological_cause):
-        evidence = {
-            'SleepEnvironment': 0 if sleep_environment['sleep_environment'] == '1' else 1,
-            'CaffeineUse': 0 if lifestyle_factor['lifestyle_factor'] != '1' else 1,
-            'MedicationUse': 0 if medication_use['medication_use'] == '5' else 1,
-            'PsychologicalIssues': 0 if psychological_cause['psychological_cause'] == '4' else 1
-        }
-        prob_insomnia = self.inference.query(variables=['Insomnia'], evidence=evidence)
-        insomnia_prob = prob_insomnia.values[1]
-        print("Probabilidad calculada de insomnio:", insomnia_prob)
-        self.recommendations.append(f"Probabilidad calculada de insomnio: {insomnia_prob}")
-        if 0.40 <= insomnia_prob < 0.50:
+        evidence = encode_insomnia_evidence(fact_values(sleep_environment, lifestyle_factor, medication_use,
+                                                        psychological_cause))
+        insomnia_prob = self.posterior_of(evidence)
+        logger.debug("Probabilidad calculada de insomnio: %s", insomnia_prob)
+        self.probability = float(insomnia_prob)
+        self.band = band_of(self.condition, insomnia_prob)
+        self.recommend('posterior')
+        if self.band == 1:
             self.diagnosis.append("Su probabilidad de insomnio está en un rango moderado.")
-            self.recommendations.append(
-                "Considere mejorar su higiene del sueño, como mantener un horario regular de sueño y evitar la cafeína y la nicotina antes de acostarse.")
+            self.recommend('band_moderate')
 
-        elif 0.50 <= insomnia_prob < 0.60:
+        elif self.band == 2:
             self.diagnosis.append("Su probabilidad de insomnio es moderadamente alta.")
-            self.recommendations.append(
-                "Además de mejorar su higiene del sueño, considere practicar técnicas de relajación antes de acostarse, como meditación o respiración profunda.")
+            self.recommend('band_moderately_high')
 
-        elif 0.60 <= insomnia_prob < 0.70:
+        elif self.band == 3:
             self.diagnosis.append("Su probabilidad de insomnio es alta.")
-            self.recommendations.append(
-                "Junto con mejorar su higiene del sueño y practicar técnicas de relajación, considere buscar ayuda profesional para evaluar y abordar cualquier condición subyacente que pueda estar contribuyendo a su insomnio.")
+            self.recommend('band_high')
 
-        elif insomnia_prob >= 0.70:
+        elif self.band == 4:
             self.diagnosis.append("Su probabilidad de insomnio es muy alta.")
-            self.recommendations.append(
-                "Es altamente recomendable que busque ayuda profesional de un médico o especialista en trastornos del sueño para una evaluación y tratamiento adecuados.")
+            self.recommend('band_very_high')
 
         self.declare(Fact(action='final_recommendations'))
 
@@ -224,14 +286,13 @@ class InsomniaExpertSystem(KnowledgeEngine):
     def final_recommendations(self, isi_score):
         score = isi_score['isi_score']
         if score > 14:
-            self.recommendations.append(
-                "Recomendamos que consulte a un profesional de la salud para un diagnóstico y tratamiento más detallado.")
+            self.recommend('see_professional')
         else:
-            self.recommendations.append("Puede considerar implementar las siguientes prácticas generales:")
-            self.recommendations.append("- Mantener una rutina regular para dormir.")
-            self.recommendations.append("- Evitar el uso de dispositivos electrónicos antes de dormir.")
-            self.recommendations.append("- Crear un ambiente de sueño adecuado.")
-            self.recommendations.append("- Practicar técnicas de relajación antes de acostarse.")
+            self.recommend('general_practices')
+            self.recommend('practice_routine')
+            self.recommend('practice_screens')
+            self.recommend('practice_sleep_environment')
+            self.recommend('practice_relaxation')
 
 
     def get_recommendations(self):
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+import jwt
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers
+
+from metrics import AUTH_EVENTS
+from supabaseConfig import SUPABASE_KEY, SUPABASE_URL, get_http_client
+
+load_dotenv()
+
+# HS256 tokens (Supabase's legacy JWT secret) are checked against SUPABASE_JWT_SECRET;
+# RS256/ES256 tokens against the project's published signing keys.
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+SUPABASE_JWT_ISSUER = os.getenv('SUPABASE_JWT_ISSUER', f'{SUPABASE_URL}/auth/v1' if SUPABASE_URL else None)
+JWT_LEEWAY = float(os.getenv('JWT_LEEWAY', 30))
+JWKS_CACHE_TTL = float(os.getenv('JWKS_CACHE_TTL', 600))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv('JWKS_MIN_REFRESH_INTERVAL', 30))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv('VERIFIED_TOKEN_CACHE_SIZE', 10000))
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+logger = logging.getLogger(__name__)
+
+
+class AuthenticatedUser(NamedTuple):
+    id: str
+    email: Optional[str]
+    role: Optional[str]
+    expires_at: float
+
+
+class SigningKeys:
+    # The JWKS is fetched once and refreshed after JWKS_CACHE_TTL, or early when a token names
+    # an unknown key id (key rotation). Refreshes are spaced by JWKS_MIN_REFRESH_INTERVAL so
+    # tokens with made-up key ids cannot hammer the auth server; if a refresh fails the
+    # previous keys stay in use.
+    def __init__(self, ttl: float = JWKS_CACHE_TTL, min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: Dict[str, jwt.PyJWK] = {}
+        self.expires = 0.0
+        self.next_refresh = 0.0
+        self.lock = asyncio.Lock()
+
+    async def get(self, kid: Optional[str]) -> jwt.PyJWK:
+        key = self.keys.get(kid)
+        if key is None or time.monotonic() >= self.expires:
+            async with self.lock:
+                key = self.keys.get(kid)
+                now = time.monotonic()
+                if (key is None or now >= self.expires) and now >= self.next_refresh:
+                    await self._refresh()
+                    key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Clave de firma desconocida.")
+        return key
+
+    async def _refresh(self):
+        self.next_refresh = time.monotonic() + self.min_refresh_interval
+        try:
+            response = await get_http_client().get(f'{SUPABASE_URL}/auth/v1/.well-known/jwks.json',
+                                                   headers={'apikey': SUPABASE_KEY})
+            response.raise_for_status()
+            keys = {}
+            for data in response.json().get('keys', []):
+                try:
+                    keys[data['kid']] = jwt.PyJWK(data)
+                except (KeyError, jwt.PyJWKError):
+                    continue
+        except (httpx.HTTPError, ValueError):
+            logger.exception("No se pudieron obtener las claves de firma de Supabase.")
+            return
+        self.keys = keys
+        self.expires = time.monotonic() + self.ttl
+
+
+class TokenVerifier:
+    # Verified tokens are remembered until they expire, so a client reusing its access token
+    # costs one dictionary lookup per request. Only tokens that passed every check get cached.
+    def __init__(self, cache_size: int = VERIFIED_TOKEN_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.signing_keys = SigningKeys()
+        self.cache: 'OrderedDict[str, AuthenticatedUser]' = OrderedDict()
+
+    async def verify(self, token: str) -> AuthenticatedUser:
+        user = self.cache.get(token)
+        if user is not None:
+            if time.time() < user.expires_at + JWT_LEEWAY:
+                self.cache.move_to_end(token)
+                AUTH_EVENTS.inc('cached')
+                return user
+            del self.cache[token]
+
+        try:
+            user = await self._verify(token)
+        except jwt.InvalidTokenError:
+            AUTH_EVENTS.inc('rejected')
+            raise
+        AUTH_EVENTS.inc('verified')
+        if self.cache_size > 0:
+            self.cache[token] = user
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return user
+
+    async def _verify(self, token: str) -> AuthenticatedUser:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get('alg')
+        if algorithm == 'HS256':
+            if not SUPABASE_JWT_SECRET:
+                raise jwt.InvalidTokenError("No hay un secreto configurado para tokens HS256.")
+            key = SUPABASE_JWT_SECRET
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            signing_key = await self.signing_keys.get(header.get('kid'))
+            if signing_key.algorithm_name != algorithm:
+                raise jwt.InvalidTokenError("El algoritmo no corresponde a la clave de firma.")
+            key = signing_key.key
+        else:
+            raise jwt.InvalidTokenError("Algoritmo de firma no permitido.")
+
+        claims = jwt.decode(token, key, algorithms=[algorithm], audience=SUPABASE_JWT_AUDIENCE,
+                            issuer=SUPABASE_JWT_ISSUER, leeway=JWT_LEEWAY, options={'require': ['exp', 'sub']})
+        return AuthenticatedUser(claims['sub'], claims.get('email'), claims.get('role'), float(claims['exp']))
+
+
+token_verifier = TokenVerifier()
+
+
+class JWTAuthMiddleware:
+    # Verifies the bearer token, when there is one, and leaves the user (or the reason it was
+    # rejected) in request.state. Endpoints that need a user depend on current_user.
+    def __init__(self, app, verifier: TokenVerifier = token_verifier):
+        self.app = app
+        self.verifier = verifier
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            state = scope.setdefault('state', {})
+            state['user'] = None
+            state['auth_error'] = None
+            authorization = Headers(scope=scope).get('authorization')
+            if authorization:
+                scheme, _, token = authorization.partition(' ')
+                if scheme.lower() != 'bearer' or not token.strip():
+                    state['auth_error'] = "Se esperaba un token Bearer."
+                else:
+                    try:
+                        state['user'] = await self.verifier.verify(token.strip())
+                    except jwt.InvalidTokenError:
+                        state['auth_error'] = "Token inválido o expirado."
+        await self.app(scope, receive, send)
+
+
+def current_user(request: Request) -> AuthenticatedUser:
+    user = getattr(request.state, 'user', None)
+    if user is None:
+        detail = getattr(request.state, 'auth_error', None) or "Se requiere autenticación."
+        raise HTTPException(status_code=401, detail=detail, headers={'WWW-Authenticate': 'Bearer'})
+    return user
+
+
+def ensure_same_user(user: AuthenticatedUser, user_id: str):
+    if user.id != user_id:
+        raise HTTPException(status_code=403, detail="No tiene permiso sobre los datos de otro usuario.")
@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import gc
+import glob
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+from dotenv import load_dotenv
+
+import main
+from analysisExecutor import analysis_executor
+from modelRegistry import preload_models
+from quizPayloads import build_quiz_payloads
+from sessionAnalytics import session_analytics
+from sessionJournal import SessionJournal, session_journal
+from sessionStore import session_store
+from supabaseConfig import close_supabase_clients, open_supabase_clients
+
+load_dotenv()
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+MAX_REQUESTS = int(os.getenv('MAX_REQUESTS', 0))
+MAX_REQUESTS_JITTER = int(os.getenv('MAX_REQUESTS_JITTER', 0))
+GRACEFUL_TIMEOUT = float(os.getenv('GRACEFUL_TIMEOUT', 30))
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', 60))
+
+logger = logging.getLogger('launcher')
+# Logged at INFO; everything else stays at WARNING, where experta's watchers are quiet.
+INFO_LOGGERS = ('launcher', 'main', 'analysisExecutor', 'sessionJournal', 'sessionAnalytics')
+
+
+def worker_journal_path(path: str, slot: int) -> str:
+    # One journal per worker slot: a journal is only ever flushed by one process, and a
+    # replacement worker in the same slot replays whatever its predecessor left behind.
+    root, extension = os.path.splitext(path)
+    return f'{root}.{slot}{extension}'
+
+
+def orphan_journal_paths(path: str, workers: int) -> List[str]:
+    # Journals of slots no worker will take, left behind by a run with more workers.
+    root, extension = os.path.splitext(path)
+    orphans = []
+    for candidate in glob.glob(f'{glob.escape(root)}.*{glob.escape(extension)}'):
+        slot = candidate[len(root) + 1:len(candidate) - len(extension)]
+        if slot.isdigit() and int(slot) >= workers:
+            orphans.append(candidate)
+    return sorted(orphans)
+
+
+async def drain_journals(paths: List[str]):
+    await open_supabase_clients()
+    await session_store.open()
+    await session_analytics.open()
+    try:
+        for path in paths:
+            journal = SessionJournal(path)
+            journal.open()
+            # Closing flushes everything the journal holds.
+            await journal.close()
+            if journal.pending:
+                logger.warning("El journal %s conserva %s sesiones; se reintentará al reiniciar.", path,
+                               journal.pending)
+            else:
+                os.remove(path)
+                logger.info("Journal huérfano %s vaciado", path)
+    finally:
+        await session_analytics.close()
+        await session_store.close()
+        await close_supabase_clients()
+
+
+class Launcher:
+    # Pre-fork supervisor. The parent imports the app and builds every model and quiz payload
+    # once, then forks the workers, which share that memory copy-on-write and accept on one
+    # listening socket the parent keeps open, so connections queue in the backlog rather than
+    # being refused while a worker is being replaced.
+    #
+    # SIGHUP replaces the workers one at a time (each is stopped, then a fresh fork takes its
+    # slot and must report ready before the next is touched). It does not load new code; restart
+    # the launcher for that. SIGTERM/SIGINT stop everything gracefully.
+    def __init__(self, workers: int, host: str, port: int, max_requests: int = MAX_REQUESTS,
+                 max_requests_jitter: int = MAX_REQUESTS_JITTER, graceful_timeout: float = GRACEFUL_TIMEOUT):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, int] = {}  # pid -> slot
+        self.started: Dict[int, float] = {}  # slot -> time.monotonic() of its last spawn
+        self.sock: Optional[socket.socket] = None
+        self.stopping = False
+        self.restart_requested = False
+
+    def prepare(self):
+        if analysis_executor.kind == 'process':
+            raise ValueError("Con el lanzador cada worker ya es un proceso; use ANALYSIS_EXECUTOR=thread.")
+        # Analyses are CPU-bound under the GIL, so extra threads per worker only add contention.
+        if 'ANALYSIS_WORKERS' not in os.environ:
+            analysis_executor.workers = 1
+        started = time.perf_counter()
+        preload_models()
+        build_quiz_payloads()
+        # Moves everything allocated so far out of the collector's reach, so collections in the
+        # workers do not write to (and thereby copy) the shared pages.
+        gc.freeze()
+        logger.info("Modelos precargados en %.2f s", time.perf_counter() - started)
+
+        orphans = orphan_journal_paths(session_journal.path, self.workers)
+        if orphans:
+            # Before forking, so the clients this opens are closed again by the time workers exist.
+            try:
+                asyncio.run(drain_journals(orphans))
+            except Exception:
+                logger.exception("No se pudieron vaciar los journals huérfanos; se reintentará al reiniciar.")
+
+        self.sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def spawn(self, slot: int) -> int:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            code = 0
+            try:
+                self._serve(slot, write_fd)
+            except BaseException:
+                logger.exception("El worker %s terminó con un error.", slot)
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.close(write_fd)
+        self.children[pid] = slot
+        self.started[slot] = time.monotonic()
+        ready = self._wait_ready(read_fd)
+        os.close(read_fd)
+        if ready:
+            logger.info("Worker %s listo (pid %s)", slot, pid)
+        else:
+            logger.error("El worker %s (pid %s) no arrancó a tiempo.", slot, pid)
+        return pid
+
+    def _wait_ready(self, read_fd: int) -> bool:
+        readable, _, _ = select.select([read_fd], [], [], READY_TIMEOUT)
+        return bool(readable) and os.read(read_fd, 1) == b'1'
+
+    def _serve(self, slot: int, ready_fd: int):
+        # SIGHUP is addressed to the supervisor; uvicorn installs its own SIGTERM/SIGINT handlers.
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        session_journal.path = worker_journal_path(session_journal.path, slot)
+
+        limit = None
+        if self.max_requests > 0:
+            # Spread recycling out so the workers do not all restart together.
+            limit = self.max_requests + random.randint(0, self.max_requests_jitter)
+        config = uvicorn.Config(main.app, limit_max_requests=limit,
+                                timeout_graceful_shutdown=int(self.graceful_timeout))
+        server = uvicorn.Server(config)
+
+        async def serve():
+            task = asyncio.create_task(server.serve(sockets=[self.sock]))
+            while not server.started and not task.done():
+                await asyncio.sleep(0.05)
+            os.write(ready_fd, b'1' if server.started else b'0')
+            os.close(ready_fd)
+            await task
+
+        asyncio.run(serve())
+
+    def terminate(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def wait(self, pid: int, deadline: float):
+        # Gives the worker until `deadline` to finish its in-flight requests, then kills it.
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            logger.warning("El worker %s no terminó a tiempo; se fuerza su cierre.", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.pop(pid, None)
+
+    def rolling_restart(self):
+        for pid, slot in sorted(self.children.items(), key=lambda item: item[1]):
+            if self.stopping:
+                return
+            logger.info("Reiniciando el worker %s (pid %s)", slot, pid)
+            self.terminate(pid)
+            self.wait(pid, time.monotonic() + self.graceful_timeout)
+            self.spawn(slot)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            # Recycled after its request limit, or crashed: either way the slot gets a fresh fork.
+            logger.info("El worker %s (pid %s) salió con estado %s; se reemplaza.", slot, pid,
+                        os.waitstatus_to_exitcode(status))
+            if time.monotonic() - self.started[slot] < 5:
+                # Dying right after starting; do not turn that into a fork loop.
+                time.sleep(1)
+            self.spawn(slot)
+
+    def run(self) -> int:
+        self.prepare()
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, 'restart_requested', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'stopping', True))
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.2)
+
+        logger.info("Deteniendo %s workers", len(self.children))
+        for pid in list(self.children):
+            self.terminate(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in list(self.children):
+            self.wait(pid, deadline)
+        self.sock.close()
+        return 0
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(prog='python launcher.py',
+                                     description='Runs the API on several pre-forked workers.')
+    parser.add_argument('--workers', type=int, default=WEB_CONCURRENCY)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS,
+                        help='recycle a worker after this many requests (0 never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=MAX_REQUESTS_JITTER)
+    parser.add_argument('--graceful-timeout', type=float, default=GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    # force: importing the app has already attached a handler to the root logger.
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(process)d] %(name)s: %(message)s',
+                        force=True)
+    for name in INFO_LOGGERS:
+        logging.getLogger(name).setLevel(logging.INFO)
+    launcher = Launcher(args.workers, args.host, args.port, args.max_requests, args.max_requests_jitter,
+                        args.graceful_timeout)
+    return launcher.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -1,30 +1,108 @@
+import asyncio
+import datetime
 import json
-from typing import List
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Literal, Optional, Union
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from dtos import QuizAnswers, AuthDto, SessionData
+from dtos import (QuizAnswers, AuthDto, SessionData, FullAssessment, FullAssessmentResult, QuizSchema,
+                  SessionRecord, AnalysisResult, AnalysisResultSchema, FullAssessmentCompactResult,
+                  SensitivityResultSchema, NodePosteriorsSchema)
 from authMethods import login_user, register_user
-from getSessions import get_user_sessions
-from experts import get_quiz, get_analysis
+from getSessions import (get_user_sessions, stream_user_sessions, session_columns, next_cursor, DEFAULT_PAGE_SIZE,
+                         MAX_PAGE_SIZE)
+from experts import conditions, get_analysis, get_batch_analysis, get_node_posteriors, get_sensitivity
+from answerCodec import MULTIPLE_CHOICE, codecs
+from analysisCache import analysis_cache
+from analysisExecutor import AnalysisDeadlineExceeded, AnalysisOverloaded, analysis_executor
+from sessionAnalytics import ensure_analytics_access, session_analytics
+from sessionJournal import session_journal
+from sessionStore import session_store
+from quizPayloads import build_quiz_payloads, get_catalog_payload, get_quiz_payload
+from resultCatalog import DEFAULT_LOCALE, render
+from metrics import STARTUP_DURATION, MetricsMiddleware, render_metrics
+from orjsonResponse import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from supabaseConfig import get_supabase_client
+from jwtAuth import AuthenticatedUser, JWTAuthMiddleware, current_user, ensure_same_user
+from supabaseConfig import open_supabase_clients, close_supabase_clients
 
-supabase = get_supabase_client()
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@contextmanager
+def startup_step(step: str):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    STARTUP_DURATION.set(elapsed, step)
+    logger.info("Arranque: %s en %.3f s", step, elapsed)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_step('quiz_payloads'):
+        build_quiz_payloads()
+    with startup_step('executor'):
+        analysis_executor.start()
+    with startup_step('supabase'):
+        await open_supabase_clients()
+    with startup_step('session_store'):
+        await session_store.open()
+    with startup_step('session_analytics'):
+        await session_analytics.open()
+    with startup_step('session_journal'):
+        session_journal.open()
+    yield
+    await session_journal.close()
+    await session_analytics.close()
+    await session_store.close()
+    await close_supabase_clients()
+    analysis_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 origins = ["https://deploy-ti-frontend.vercel.app", "http://deploy-ti-frontend.vercel.app"]
 
+# Added first so it runs innermost: CORS headers and metrics also cover 401/403 responses.
+app.add_middleware(JWTAuthMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+
+@app.exception_handler(AnalysisOverloaded)
+async def analysis_overloaded(request: Request, error: AnalysisOverloaded):
+    return ORJSONResponse(status_code=503, content={"detail": str(error)},
+                          headers={"Retry-After": str(error.retry_after)})
+
+
+@app.exception_handler(AnalysisDeadlineExceeded)
+async def analysis_deadline_exceeded(request: Request, error: AnalysisDeadlineExceeded):
+    return ORJSONResponse(status_code=504, content={"detail": str(error)})
+
+
+def request_deadline(request: Request) -> float:
+    # Clients may ask for a tighter budget than the server's, never a looser one.
+    timeout = analysis_executor.deadline
+    try:
+        requested = float(request.headers.get("x-request-timeout", timeout))
+    except ValueError:
+        requested = timeout
+    if not 0 <= requested <= timeout:  # also catches NaN
+        requested = timeout
+    return time.monotonic() + requested
 
 
 @app.get("/")
@@ -32,38 +110,183 @@ async def root():
     return {"message": "Hello World"}
 
 
-@app.get("/quiz/{condition}")
-async def quiz(condition: str):
-    return get_quiz(condition)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/quiz/{condition}", response_model=QuizSchema)
+async def quiz(condition: str, request: Request):
+    payload = get_quiz_payload(condition)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Condición desconocida.")
+    return payload.response(request.headers.get('if-none-match'), request.headers.get('accept-encoding'))
+
+
+@app.get("/catalog/{locale}")
+async def catalog(locale: str, request: Request):
+    payload = get_catalog_payload(locale)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Idioma no disponible.")
+    return payload.response(request.headers.get('if-none-match'), request.headers.get('accept-encoding'))
+
+
+def unpack(answer: QuizAnswers) -> QuizAnswers:
+    if answer.packed is None:
+        check_choices(answer)
+        return answer
+    codec = codecs.get(answer.condition)
+    if codec is None:
+        raise HTTPException(status_code=404, detail="Condición desconocida.")
+    try:
+        answers = codec.decode(codec.from_text(answer.packed))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return QuizAnswers(condition=answer.condition, answers=answers)
+
+
+def check_choices(answer: QuizAnswers):
+    # Only multiple choice questions take a list of options.
+    codec = codecs.get(answer.condition)
+    if codec is None:
+        return
+    for field in codec.fields:
+        if field.answer_mode != MULTIPLE_CHOICE and isinstance(answer.answers.get(field.fact), list):
+            raise HTTPException(status_code=400, detail=f"La respuesta a '{field.fact}' debe ser una sola opción.")
+
 
+def quiz_answers(condition: str, answers) -> QuizAnswers:
+    if isinstance(answers, str):
+        return unpack(QuizAnswers(condition=condition, packed=answers))
+    return unpack(QuizAnswers(condition=condition, answers=answers))
 
-@app.post("/analyze/")
-async def analyze(answer: QuizAnswers):
-    return get_analysis(answer)
+
+def cached_analysis(answer: QuizAnswers, deadline: float):
+    return analysis_cache.get(answer.condition, answer.answers,
+                              lambda: analysis_executor.run(get_analysis, answer, deadline=deadline))
+
+
+# Analyses answer with the rendered texts by default; format=compact returns the result itself
+# (posterior, band and codes), whose texts clients take from /catalog/{locale}.
+def present(result: AnalysisResult, result_format: str, locale: str):
+    if result_format == 'compact':
+        return result.as_json()
+    return render(result, locale)
+
+
+@app.post("/analyze/", response_model=Union[List[str], AnalysisResultSchema])
+async def analyze(answer: QuizAnswers, request: Request,
+                  result_format: Literal['text', 'compact'] = Query('text', alias='format'),
+                  locale: str = DEFAULT_LOCALE):
+    result = await cached_analysis(unpack(answer), request_deadline(request))
+    return present(result, result_format, locale)
+
+
+@app.post("/analyze/batch", response_model=Union[List[List[str]], List[AnalysisResultSchema]])
+async def analyze_batch(answers: List[QuizAnswers], request: Request,
+                        result_format: Literal['text', 'compact'] = Query('text', alias='format'),
+                        locale: str = DEFAULT_LOCALE):
+    answers = [unpack(answer) for answer in answers]
+    results = await analysis_executor.run(get_batch_analysis, answers, deadline=request_deadline(request))
+    return [present(result, result_format, locale) for result in results]
+
+
+@app.post("/analyze/full", response_model=Union[FullAssessmentResult, FullAssessmentCompactResult])
+async def analyze_full(assessment: FullAssessment, request: Request,
+                       result_format: Literal['text', 'compact'] = Query('text', alias='format'),
+                       locale: str = DEFAULT_LOCALE):
+    deadline = request_deadline(request)
+    screening = await cached_analysis(quiz_answers("screening", assessment.screening), deadline)
+    diagnosis = list(screening.codes)
+    missing = [condition for condition in diagnosis if condition not in assessment.answers]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Faltan las respuestas de: {', '.join(missing)}.")
+
+    # Each flagged sub-system goes to the pool on its own, so the request takes as long as the
+    # slowest of them rather than their sum. All are checked first, so a rejected one leaves no
+    # analysis started.
+    answers = [quiz_answers(condition, assessment.answers[condition]) for condition in diagnosis]
+    results = await asyncio.gather(*(cached_analysis(answer, deadline) for answer in answers))
+    if result_format == 'compact':
+        return {"diagnosis": diagnosis, "results": [result.as_json() for result in results]}
+    recommendations = []
+    for result in results:
+        recommendations.extend(render(result, locale))
+    return {"diagnosis": diagnosis, "recommendations": recommendations}
+
+
+async def network_analysis(function, answer: QuizAnswers, request: Request):
+    answer = unpack(answer)
+    if answer.condition not in conditions or answer.condition == "screening":
+        raise HTTPException(status_code=404, detail="La condición no tiene red bayesiana.")
+    try:
+        result = await analysis_executor.run(function, answer, deadline=request_deadline(request))
+    except KeyError as error:
+        raise HTTPException(status_code=400, detail=f"Falta la respuesta a '{error.args[0]}'.")
+    return result.as_json()
+
+
+@app.post("/analyze/sensitivity", response_model=SensitivityResultSchema)
+async def analyze_sensitivity(answer: QuizAnswers, request: Request):
+    return await network_analysis(get_sensitivity, answer, request)
+
+
+@app.post("/analyze/nodes", response_model=NodePosteriorsSchema)
+async def analyze_nodes(answer: QuizAnswers, request: Request):
+    return await network_analysis(get_node_posteriors, answer, request)
 
 
 @app.post("/login/")
 async def login(user_data: AuthDto):
-    return login_user(user_data.email, user_data.password)
+    return await login_user(user_data.email, user_data.password)
 
 
 @app.post("/signup/")
 async def login(user_data: AuthDto):
-    return register_user(user_data.email, user_data.password)
+    return await register_user(user_data.email, user_data.password)
+
+
+@app.get("/session/{user_id}", response_model=List[SessionRecord])
+async def session(user_id: str,
+                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                  before: Optional[int] = None, since: Optional[int] = None, fields: Optional[str] = None,
+                  response_format: Literal['json', 'ndjson'] = Query('json', alias='format'),
+                  user: AuthenticatedUser = Depends(current_user)):
+    ensure_same_user(user, user_id)
+    try:
+        columns = session_columns(fields)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
 
+    if response_format == 'ndjson':
+        return StreamingResponse(stream_user_sessions(user_id, limit, before, since, columns),
+                                 media_type='application/x-ndjson')
 
-@app.get("/session/{user_id}")
-async def session(user_id: str):
-    return get_user_sessions(user_id)
+    sessions = await get_user_sessions(user_id, limit, before, since, columns)
+    cursor = next_cursor(sessions, limit)
+    headers = {'X-Next-Cursor': str(cursor)} if cursor is not None else None
+    # Stored rows are already plain JSON values; hand them to orjson without re-validating.
+    return ORJSONResponse(sessions, headers=headers)
 
 
-@app.post("/save_data/")
-def save_session_data(data: SessionData):
+@app.post("/save_data/", status_code=202)
+async def save_session_data(data: SessionData, user: AuthenticatedUser = Depends(current_user)):
+    ensure_same_user(user, data.user_id)
+    # Compact results are stored as such, which keeps rows small and queryable.
+    to_save = [item if isinstance(item, str) else item.model_dump() for item in data.to_save]
     session_data = {
-        'data': json.dumps(data.to_save),
+        'data': json.dumps(to_save, separators=(',', ':')),
         'user_id': data.user_id
     }
-    supabase.table('sessions').insert(session_data).execute()
+    await session_journal.append(session_data)
+
+
+@app.get("/analytics")
+async def get_analytics(condition: Optional[str] = None, since: Optional[datetime.date] = None,
+                        until: Optional[datetime.date] = None, user: AuthenticatedUser = Depends(current_user)):
+    ensure_analytics_access(user)
+    # Served from the pre-aggregated tables; the sessions table is never read.
+    return await session_analytics.summary(condition, since, until)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,203 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+from starlette.routing import Match
+
+# Seconds; spans a posterior lookup (~microseconds) up to a slow Supabase round trip.
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_registry: List = []
+
+
+def _format_labels(labelnames: Sequence[str], labels: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def drain(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self.lock:
+            series, self.series = self.series, {}
+        return series
+
+    def merge(self, drained: Dict[Tuple[str, ...], List[float]]):
+        with self.lock:
+            for labels, values in drained.items():
+                series = self.series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+                for index, value in enumerate(values):
+                    series[index] += value
+
+    def render(self) -> List[str]:
+        with self.lock:
+            snapshot = {labels: list(values) for labels, values in self.series.items()}
+        lines = []
+        for labels, values in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {values[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self.lock:
+            self.values[labels] = value
+
+    def render(self) -> List[str]:
+        with self.lock:
+            snapshot = dict(self.values)
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+                for labels, value in sorted(snapshot.items())]
+
+
+class Counter(Gauge):
+    # Same storage as a gauge; callers only ever inc() it.
+    kind = 'counter'
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def drain_worker_metrics() -> Dict[str, Dict]:
+    # Process-pool workers ship what they recorded back to the parent, which serves /metrics.
+    return {metric.name: metric.drain() for metric in _registry if isinstance(metric, Histogram)}
+
+
+def merge_worker_metrics(drained: Dict[str, Dict]):
+    for metric in _registry:
+        if metric.name in drained:
+            metric.merge(drained[metric.name])
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency by endpoint.',
+                            ('method', 'endpoint', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being served.', ('endpoint',))
+ANALYSIS_LATENCY = Histogram('analysis_duration_seconds', 'Time to analyse one questionnaire.', ('condition',))
+ANALYSIS_STAGE_LATENCY = Histogram('analysis_stage_duration_seconds',
+                                   'Analysis time by stage: construct, declare, rules (includes inference) '
+                                   'and inference.', ('condition', 'stage'))
+STARTUP_DURATION = Gauge('app_startup_step_seconds', 'Time spent in each lifespan startup step.', ('step',))
+ANALYSIS_QUEUE_DEPTH = Gauge('analysis_queue_depth', 'Analysis requests waiting for a worker.')
+ANALYSIS_QUEUE_WAIT = Histogram('analysis_queue_wait_seconds', 'Time analysis requests waited for a worker.')
+ANALYSIS_REJECTIONS = Counter('analysis_rejections_total',
+                              'Analysis requests turned away: queue_full, queue_timeout or deadline.', ('reason',))
+ANALYSIS_CACHE_EVENTS = Counter('analysis_cache_events_total',
+                                'Analysis result cache lookups by outcome: hit, miss, coalesced, expired, eviction.',
+                                ('condition', 'event'))
+ANALYSIS_CACHE_ENTRIES = Gauge('analysis_cache_entries', 'Results currently held by the analysis cache.')
+AUTH_EVENTS = Counter('auth_token_checks_total', 'Bearer token checks by outcome: cached, verified, rejected.',
+                      ('result',))
+SUPABASE_LATENCY = Histogram('supabase_request_duration_seconds', 'Supabase round trips by operation.',
+                             ('operation',))
+SQLITE_LATENCY = Histogram('sqlite_query_duration_seconds', 'Local SQLite session store queries by operation.',
+                           ('operation',))
+ANALYTICS_SESSIONS = Counter('analytics_sessions_total', 'Sessions added to the analytics aggregates by source: '
+                             'save or backfill.', ('source',))
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware; endpoints are labelled by route template so path parameters such as
+    # user ids do not create new series.
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope) -> str:
+        partial = 'unmatched'
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial == 'unmatched':
+                # Path matched but not the method, e.g. a CORS preflight.
+                partial = route.path
+        return partial
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope['method'], endpoint, str(status))
+            REQUESTS_IN_FLIGHT.dec(endpoint)
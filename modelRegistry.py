@@ -0,0 +1,87 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, NamedTuple, Tuple
+
+from compiledInference import MarginalTable, PosteriorTable
+
+if TYPE_CHECKING:
+    from pgmpy.inference import VariableElimination
+    from pgmpy.models import BayesianNetwork
+
+
+class CompiledModel(NamedTuple):
+    model: 'BayesianNetwork'
+    inference: 'VariableElimination'
+    posterior: PosteriorTable
+    encode: Callable[[Mapping[str, Any]], Dict[str, int]]
+
+
+_builders: Dict[str, Tuple[Callable[[], 'BayesianNetwork'], str, List[str], Callable]] = {}
+_models: Dict[str, CompiledModel] = {}
+_marginals: Dict[str, MarginalTable] = {}
+_versions: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def register_model(condition: str, builder: Callable[[], 'BayesianNetwork'], target: str, evidence: List[str],
+                   encode: Callable[[Mapping[str, Any]], Dict[str, int]]):
+    with _lock:
+        _builders[condition] = (builder, target, evidence, encode)
+        _models.pop(condition, None)
+        _marginals.pop(condition, None)
+        _versions[condition] = _versions.get(condition, 0) + 1
+
+
+def invalidate_model(condition: str):
+    # Forces a rebuild on next use and retires anything cached against the old definition.
+    with _lock:
+        _models.pop(condition, None)
+        _marginals.pop(condition, None)
+        _versions[condition] = _versions.get(condition, 0) + 1
+
+
+def has_model(condition: str) -> bool:
+    return condition in _builders
+
+
+def registered_models() -> List[str]:
+    return list(_builders)
+
+
+def model_version(condition: str) -> int:
+    return _versions.get(condition, 0)
+
+
+def get_model(condition: str) -> CompiledModel:
+    # Built and validated once per process, then shared read-only by every engine instance.
+    compiled = _models.get(condition)
+    if compiled is None:
+        with _lock:
+            compiled = _models.get(condition)
+            if compiled is None:
+                # pgmpy drags in torch and scikit-learn, seconds of import time, so it is only
+                # loaded once a model is actually needed.
+                from pgmpy.inference import VariableElimination
+
+                builder, target, evidence, encode = _builders[condition]
+                model = builder()
+                inference = VariableElimination(model)
+                compiled = CompiledModel(model, inference, PosteriorTable(inference, target, evidence), encode)
+                _models[condition] = compiled
+    return compiled
+
+
+def get_marginals(condition: str) -> MarginalTable:
+    # Only built once someone asks for the node posteriors, not on preload.
+    table = _marginals.get(condition)
+    if table is None:
+        compiled = get_model(condition)
+        with _lock:
+            table = _marginals.get(condition)
+            if table is None:
+                table = _marginals[condition] = MarginalTable(compiled.model, list(compiled.posterior.evidence))
+    return table
+
+
+def preload_models():
+    for condition in registered_models():
+        get_model(condition)
@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+import orjson
+from dotenv import load_dotenv
+from fastapi.responses import Response
+
+from experts import conditions
+from resultCatalog import locales, text_catalog
+
+load_dotenv()
+
+QUIZ_CACHE_MAX_AGE = int(os.getenv('QUIZ_CACHE_MAX_AGE', 86400))
+
+
+class StaticPayload:
+    # A JSON document that only changes on deploy (a quiz, the text catalog), serialized and
+    # compressed once and served with an ETag.
+    def __init__(self, data: Any):
+        self.body = orjson.dumps(data)
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def response(self, if_none_match: Optional[str], accept_encoding: Optional[str]) -> Response:
+        use_gzip = _accepts_gzip(accept_encoding)
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={QUIZ_CACHE_MAX_AGE}',
+            'Vary': 'Accept-Encoding',
+        }
+        if _matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+            return Response(self.gzip_body, media_type='application/json', headers=headers)
+        return Response(self.body, media_type='application/json', headers=headers)
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # If-None-Match uses weak comparison.
+    return '*' in candidates or etag in [candidate.removeprefix('W/') for candidate in candidates]
+
+
+_payloads: Dict[str, StaticPayload] = {}
+_catalog_payloads: Dict[str, StaticPayload] = {}
+
+
+def build_quiz_payloads():
+    # Under the launcher the parent builds these before forking; workers keep its copies, which
+    # stay shared copy-on-write, rather than allocating their own.
+    if _payloads:
+        return
+    for condition, (_, quiz) in conditions.items():
+        _payloads[condition] = StaticPayload(quiz.as_json())
+    for locale in locales():
+        _catalog_payloads[locale] = StaticPayload(text_catalog(locale))
+
+
+def get_quiz_payload(condition: str) -> Optional[StaticPayload]:
+    return _payloads.get(condition)
+
+
+def get_catalog_payload(locale: str) -> Optional[StaticPayload]:
+    return _catalog_payloads.get(locale)
@@ -0,0 +1,90 @@
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence
+
+from dtos import RESULT_SCHEMA_VERSION, AnalysisResult
+
+DEFAULT_LOCALE = 'es'
+# The code whose text shows the posterior; its template has a {posterior} field.
+POSTERIOR_CODE = 'posterior'
+
+# locale -> condition -> code -> text. Each condition module registers its own texts.
+_catalogs: Dict[str, Dict[str, Dict[str, str]]] = {}
+# condition -> the code each band adds, by band id - 1.
+_bands: Dict[str, Sequence[str]] = {}
+# condition -> the lowest posterior of each band, by band id - 1.
+_thresholds: Dict[str, Sequence[float]] = {}
+
+
+def register_texts(condition: str, texts: Dict[str, str], locale: str = DEFAULT_LOCALE,
+                   bands: Sequence[str] = (), thresholds: Sequence[float] = ()):
+    _catalogs.setdefault(locale, {})[condition] = texts
+    if bands:
+        _bands[condition] = bands
+    if thresholds:
+        _thresholds[condition] = thresholds
+
+
+def band_count(condition: str) -> int:
+    return len(_bands.get(condition, ()))
+
+
+def band_of(condition: str, posterior: float) -> int:
+    # 0 below the lowest band. The engines band their posterior with this, and analytics
+    # re-derives stored bands with it.
+    return bisect_right(_thresholds[condition], posterior)
+
+
+def locales() -> List[str]:
+    return sorted(_catalogs)
+
+
+def text_catalog(locale: str) -> Optional[Dict]:
+    if locale not in _catalogs:
+        return None
+    # Codes a translation lacks are served in the default locale.
+    texts = {condition: dict(codes) for condition, codes in _catalogs.get(DEFAULT_LOCALE, {}).items()}
+    for condition, codes in _catalogs[locale].items():
+        texts.setdefault(condition, {}).update(codes)
+    return {'v': RESULT_SCHEMA_VERSION, 'locale': locale, 'texts': texts}
+
+
+def render(result: AnalysisResult, locale: str = DEFAULT_LOCALE) -> List[str]:
+    # Codes without a text (the screening's condition names) render as themselves.
+    texts = _catalogs.get(locale, {}).get(result.condition, {})
+    fallback = _catalogs.get(DEFAULT_LOCALE, {}).get(result.condition, {})
+    rendered = []
+    for code in result.codes:
+        text = texts.get(code) or fallback.get(code, code)
+        if code == POSTERIOR_CODE:
+            text = text.format(posterior=result.posterior)
+        rendered.append(text)
+    return rendered
+
+
+def parse_texts(texts: Sequence[str], locale: str = DEFAULT_LOCALE) -> List[AnalysisResult]:
+    # Recovers posterior and band from rendered texts (what older clients saved): each
+    # posterior sentence starts a result for its condition, and that condition's band
+    # sentence, if one follows, gives the band. Other sentences are ignored, so the codes
+    # come back empty.
+    catalog = _catalogs.get(locale, {})
+    prefixes = [(condition, codes[POSTERIOR_CODE].split('{posterior}')[0]) for condition, codes in catalog.items()
+                if POSTERIOR_CODE in codes]
+    results = []
+    current = None
+    for text in texts:
+        for condition, prefix in prefixes:
+            if text.startswith(prefix):
+                try:
+                    posterior = float(text[len(prefix):])
+                except ValueError:
+                    break
+                current = [condition, posterior, 0]
+                results.append(current)
+                break
+        else:
+            if current is not None:
+                codes = catalog[current[0]]
+                for band, code in enumerate(_bands.get(current[0], ()), 1):
+                    if codes.get(code) == text:
+                        current[2] = band
+    return [AnalysisResult(condition, posterior, band, ()) for condition, posterior, band in results]
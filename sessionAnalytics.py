@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from jwtAuth import AuthenticatedUser
+from metrics import ANALYTICS_SESSIONS
+from modelRegistry import get_model, has_model, model_version, registered_models
+from resultCatalog import band_count, band_of, parse_texts
+from sessionStore import session_store
+from supabaseConfig import close_supabase_clients, open_supabase_clients
+
+load_dotenv()
+
+ANALYTICS_DB_PATH = os.getenv('ANALYTICS_DB_PATH', 'analytics.db')
+ANALYTICS_BACKFILL_CHUNK = int(os.getenv('ANALYTICS_BACKFILL_CHUNK', 1000))
+# User ids or emails allowed to read the population aggregates; nobody when empty.
+ANALYTICS_USERS = {value.strip() for value in os.getenv('ANALYTICS_USERS', '').split(',') if value.strip()}
+# Posteriors are counted in equal-width bins over [0, 1].
+HISTOGRAM_BINS = 10
+# How far a stored posterior may be from one the network produces, for rounding in transit.
+POSTERIOR_TOLERANCE = 1e-9
+
+logger = logging.getLogger(__name__)
+
+# condition -> (model version, sorted distinct posteriors of its network).
+_attainable: Dict[str, Tuple[int, np.ndarray]] = {}
+
+
+def attainable_posteriors(condition: str) -> np.ndarray:
+    # A network only ever yields one posterior per evidence pattern, read from its table.
+    version = model_version(condition)
+    cached = _attainable.get(condition)
+    if cached is None or cached[0] != version:
+        cached = _attainable[condition] = (version, np.unique(get_model(condition).posterior.values))
+    return cached[1]
+
+
+def produced_posterior(condition: str, posterior: float) -> Optional[float]:
+    # The posterior the network produces within POSTERIOR_TOLERANCE of `posterior`, if any.
+    values = attainable_posteriors(condition)
+    position = int(np.searchsorted(values, posterior))
+    for index in (position - 1, position):
+        if 0 <= index < values.size and abs(values[index] - posterior) <= POSTERIOR_TOLERANCE:
+            return float(values[index])
+    return None
+
+
+def valid_result(condition, posterior, band) -> bool:
+    # Stored results come from clients, and sessions keep no answers to recompute them from, so
+    # only what the server could have returned is counted: a registered condition, a posterior
+    # its network actually produces and the band the engines give that posterior.
+    if not isinstance(condition, str) or not has_model(condition) or not band_count(condition):
+        return False
+    if type(band) is not int:
+        return False
+    if type(posterior) not in (int, float) or not 0 <= posterior <= 1:  # also rejects NaN
+        return False
+    produced = produced_posterior(condition, posterior)
+    return produced is not None and band == band_of(condition, produced)
+
+
+def session_results(data) -> Iterator[Tuple[str, float, int]]:
+    # (condition, posterior, band) for each valid condition result in a sessions.data value: a
+    # JSON list of compact results or, from older clients, of rendered texts. The screening has
+    # no posterior and is not counted.
+    try:
+        items = orjson.loads(data) if isinstance(data, (str, bytes)) else data
+    except orjson.JSONDecodeError:
+        return
+    if not isinstance(items, list):
+        return
+    results = [(item.get('condition'), item.get('posterior'), item.get('band')) for item in items
+               if isinstance(item, dict) and item.get('posterior') is not None]
+    texts = [item for item in items if isinstance(item, str)]
+    if texts:
+        results.extend(parse_texts(texts))
+    for condition, posterior, band, *_ in results:
+        if valid_result(condition, posterior, band):
+            yield condition, float(posterior), band
+
+
+def histogram_bin(posterior: float) -> int:
+    return min(max(int(posterior * HISTOGRAM_BINS), 0), HISTOGRAM_BINS - 1)
+
+
+class Deltas:
+    # What a batch of sessions adds to the aggregates, summed in memory so the batch costs one
+    # upsert per (day, condition, band) and per histogram bin rather than one per session.
+    def __init__(self):
+        self.bands: Dict[Tuple[str, str, int], List[float]] = {}
+        self.bins: Dict[Tuple[str, str, int], int] = {}
+        self.sessions = 0
+
+    def add(self, day: str, data):
+        self.sessions += 1
+        for condition, posterior, band in session_results(data):
+            totals = self.bands.setdefault((day, condition, band), [0, 0.0])
+            totals[0] += 1
+            totals[1] += posterior
+            key = (day, condition, histogram_bin(posterior))
+            self.bins[key] = self.bins.get(key, 0) + 1
+
+
+class SessionAnalytics:
+    # Per-day counters and posterior histograms for each condition and band, kept in a SQLite
+    # file shared by every worker: saves add to them as the session journal flushes, and
+    # backfill() folds in the sessions stored before they existed. Reads touch only these
+    # tables, whose size grows with days x conditions x bands, never with the sessions table.
+    #
+    # Sessions are split by id at the backfill cutoff: the saves count those above it and the
+    # backfill those up to it, so none is counted twice. The first batch saved sets the cutoff
+    # just below its own ids, or the backfill sets it to the newest id if it runs first. The
+    # backfill commits its position with each chunk and resumes where it stopped.
+    def __init__(self, path: str = ANALYTICS_DB_PATH):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    def _open(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA busy_timeout=5000')
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS analytics_bands (
+                day TEXT NOT NULL,
+                condition TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                posterior_sum REAL NOT NULL,
+                PRIMARY KEY (day, condition, band)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_histogram (
+                day TEXT NOT NULL,
+                condition TEXT NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, condition, bin)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        ''')
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _meta(self, key: str) -> Optional[int]:
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM analytics_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta_once(self, key: str, value: int):
+        # Several workers may open the file at once; the first one to record the value wins.
+        with self.lock:
+            self.connection.execute('INSERT OR IGNORE INTO analytics_meta (key, value) VALUES (?, ?)', (key, value))
+
+    async def record(self, rows: List[Tuple[int, str]], day: Optional[str] = None):
+        # `rows` are the (id, data) of sessions that have just reached the session store.
+        if self.connection is None or not rows:
+            return
+        day = day or datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        deltas = await asyncio.to_thread(self._record, rows, day)
+        ANALYTICS_SESSIONS.inc('save', amount=deltas.sessions)
+
+    def _record(self, rows: List[Tuple[int, str]], day: str) -> Deltas:
+        # Off the event loop: checking posteriors may build a condition's model.
+        self._set_meta_once('backfill_cutoff', min(session_id for session_id, _ in rows) - 1)
+        cutoff = self._meta('backfill_cutoff')
+        deltas = Deltas()
+        for session_id, data in rows:
+            if session_id > cutoff:
+                deltas.add(day, data)
+        self._apply(deltas)
+        return deltas
+
+    def _apply(self, deltas: Deltas, position: Optional[Tuple[int, int]] = None) -> bool:
+        # One transaction per batch. `position` is the backfill's (expected, new) position: the
+        # chunk is only applied if no other backfill has moved past it meanwhile.
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                if position is not None:
+                    current = self.connection.execute(
+                        "SELECT value FROM analytics_meta WHERE key = 'backfill_position'").fetchone()
+                    if (current[0] if current else 0) != position[0]:
+                        self.connection.execute('ROLLBACK')
+                        return False
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO analytics_meta (key, value) VALUES ('backfill_position', ?)",
+                        (position[1],))
+                self.connection.executemany(
+                    'INSERT INTO analytics_bands (day, condition, band, count, posterior_sum) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (day, condition, band) DO UPDATE SET count = count + excluded.count, '
+                    'posterior_sum = posterior_sum + excluded.posterior_sum',
+                    [(*key, count, total) for key, (count, total) in deltas.bands.items()])
+                self.connection.executemany(
+                    'INSERT INTO analytics_histogram (day, condition, bin, count) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (day, condition, bin) DO UPDATE SET count = count + excluded.count',
+                    [(*key, count) for key, count in deltas.bins.items()])
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+        return True
+
+    async def backfill(self, chunk_size: int = ANALYTICS_BACKFILL_CHUNK) -> int:
+        # Streams the sessions up to the cutoff in id order, one chunk in memory at a time.
+        if not any(band_count(condition) for condition in registered_models()):
+            # Every result would be dropped as invalid while the position still moved past it.
+            raise RuntimeError("No hay condiciones registradas; no se pueden rellenar las analíticas.")
+        if self._meta('backfill_cutoff') is None:
+            self._set_meta_once('backfill_cutoff', await session_store.last_id())
+        cutoff = self._meta('backfill_cutoff')
+        position = self._meta('backfill_position') or 0
+        folded = 0
+        while position < cutoff:
+            rows = await session_store.scan(position, cutoff, chunk_size)
+            if not rows:
+                break
+            deltas = await asyncio.to_thread(self._chunk_deltas, rows)
+            last = rows[-1]['id']
+            if not await asyncio.to_thread(self._apply, deltas, (position, last)):
+                raise RuntimeError("Otro proceso está rellenando las analíticas.")
+            ANALYTICS_SESSIONS.inc('backfill', amount=deltas.sessions)
+            folded += deltas.sessions
+            position = last
+            logger.info("Analíticas: %d sesiones históricas procesadas (id %d de %d)", folded, position, cutoff)
+        return folded
+
+    @staticmethod
+    def _chunk_deltas(rows: List[dict]) -> Deltas:
+        deltas = Deltas()
+        for row in rows:
+            deltas.add(str(row['created_at'])[:10], row['data'])
+        return deltas
+
+    async def summary(self, condition: Optional[str] = None, since: Optional[datetime.date] = None,
+                      until: Optional[datetime.date] = None) -> dict:
+        return await asyncio.to_thread(self._summary, condition, since, until)
+
+    def _summary(self, condition: Optional[str], since: Optional[datetime.date],
+                 until: Optional[datetime.date]) -> dict:
+        where = []
+        parameters = []
+        if condition is not None:
+            where.append('condition = ?')
+            parameters.append(condition)
+        if since is not None:
+            where.append('day >= ?')
+            parameters.append(since.isoformat())
+        if until is not None:
+            where.append('day <= ?')
+            parameters.append(until.isoformat())
+        clause = f" WHERE {' AND '.join(where)}" if where else ''
+        with self.lock:
+            bands = self.connection.execute(
+                f'SELECT day, condition, band, count, posterior_sum FROM analytics_bands{clause}', parameters).fetchall()
+            bins = self.connection.execute(
+                f'SELECT day, condition, bin, count FROM analytics_histogram{clause}', parameters).fetchall()
+            meta = dict(self.connection.execute('SELECT key, value FROM analytics_meta').fetchall())
+        groups: Dict[Tuple[str, str], dict] = {}
+        for day, name, band, count, total in bands:
+            group = groups.setdefault((day, name), {'day': day, 'condition': name, 'count': 0, 'posterior_sum': 0.0,
+                                                    'bands': {}, 'histogram': [0] * HISTOGRAM_BINS})
+            group['count'] += count
+            group['posterior_sum'] += total
+            group['bands'][str(band)] = count
+        for day, name, index, count in bins:
+            if (day, name) in groups:
+                groups[(day, name)]['histogram'][index] = count
+        series = []
+        for key in sorted(groups):
+            group = groups[key]
+            total = group.pop('posterior_sum')
+            group['mean_posterior'] = total / group['count'] if group['count'] else None
+            series.append(group)
+        # No cutoff yet means nothing has been saved or backfilled since analytics started.
+        cutoff = meta.get('backfill_cutoff')
+        position = meta.get('backfill_position', 0)
+        return {'histogram_bins': HISTOGRAM_BINS, 'series': series,
+                'backfill': {'cutoff': cutoff, 'position': position,
+                             'complete': cutoff is not None and position >= cutoff}}
+
+
+def ensure_analytics_access(user: AuthenticatedUser):
+    if user.id not in ANALYTICS_USERS and user.email not in ANALYTICS_USERS:
+        raise HTTPException(status_code=403, detail="No tiene permiso para ver las analíticas.")
+
+
+session_analytics = SessionAnalytics()
+
+
+async def run_backfill(chunk_size: int) -> int:
+    await open_supabase_clients()
+    await session_store.open()
+    try:
+        await session_analytics.open()
+        try:
+            return await session_analytics.backfill(chunk_size)
+        finally:
+            await session_analytics.close()
+    finally:
+        await session_store.close()
+        await close_supabase_clients()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Agrega las sesiones históricas a las analíticas.")
+    parser.add_argument('--chunk-size', type=int, default=ANALYTICS_BACKFILL_CHUNK,
+                        help="Sesiones leídas por consulta.")
+    args = parser.parse_args()
+    import experts  # registers the conditions whose results are counted
+    logging.basicConfig(level=logging.INFO)
+    folded = asyncio.run(run_backfill(args.chunk_size))
+    print(f"{folded} sesiones agregadas.")
+
+
+if __name__ == '__main__':
+    main_cli()
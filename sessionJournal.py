@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from sessionAnalytics import session_analytics
+from sessionStore import session_store
+
+load_dotenv()
+
+SESSION_JOURNAL_PATH = os.getenv('SESSION_JOURNAL_PATH', 'session_journal.db')
+SESSION_FLUSH_BATCH_SIZE = int(os.getenv('SESSION_FLUSH_BATCH_SIZE', 100))
+SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', 1.0))
+# Seconds a flusher may hold a batch before another process may take it over.
+SESSION_CLAIM_TIMEOUT = float(os.getenv('SESSION_CLAIM_TIMEOUT', 60))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionJournal:
+    # Saves are acknowledged once they are in the local SQLite journal; a background task moves
+    # them to the session store in multi-row inserts. Delivery is at-least-once: a crash between
+    # the insert and the journal cleanup replays that batch on the next start.
+    #
+    # Several processes may share the file (uvicorn --workers), so each flusher first claims its
+    # batch in one transaction and only ever deletes rows it claimed. A claim older than
+    # claim_timeout counts as abandoned by a dead process and can be taken over.
+    def __init__(self, path: str = SESSION_JOURNAL_PATH, batch_size: int = SESSION_FLUSH_BATCH_SIZE,
+                 flush_interval: float = SESSION_FLUSH_INTERVAL, claim_timeout: float = SESSION_CLAIM_TIMEOUT):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.claim_timeout = claim_timeout
+        self.owner = ''
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.closing = False
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA busy_timeout=5000')
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=FULL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, '
+            'data TEXT NOT NULL, claimed_by TEXT, claimed_at REAL)')
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(journal)')}
+        if 'claimed_by' not in columns:
+            # Journal written before claims existed.
+            self.connection.execute('ALTER TABLE journal ADD COLUMN claimed_by TEXT')
+            self.connection.execute('ALTER TABLE journal ADD COLUMN claimed_at REAL')
+        # Per process, and per open, so a forked worker never shares its parent's claims.
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex}'
+        # Anything left over from the previous run is replayed by the first flush.
+        self.pending = self.connection.execute('SELECT COUNT(*) FROM journal').fetchone()[0]
+        self.closing = False
+        self.wakeup = asyncio.Event()
+        if self.pending:
+            self.wakeup.set()
+        self.task = asyncio.create_task(self._run())
+
+    async def append(self, session_data: dict):
+        await asyncio.to_thread(self._append, session_data['user_id'], session_data['data'])
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.wakeup.set()
+
+    def _append(self, user_id: str, data: str):
+        with self.lock:
+            self.connection.execute('INSERT INTO journal (user_id, data) VALUES (?, ?)', (user_id, data))
+
+    def _claim_batch(self) -> List[Tuple[int, str, str]]:
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.execute(
+                    'UPDATE journal SET claimed_by = ?, claimed_at = ? WHERE seq IN (SELECT seq FROM journal '
+                    'WHERE claimed_by IS NULL OR claimed_at < ? ORDER BY seq LIMIT ?)',
+                    (self.owner, now, now - self.claim_timeout, self.batch_size))
+                batch = self.connection.execute(
+                    'SELECT seq, user_id, data FROM journal WHERE claimed_by = ? ORDER BY seq', (self.owner,)).fetchall()
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+        return batch
+
+    def _release(self):
+        with self.lock:
+            self.connection.execute('UPDATE journal SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?',
+                                    (self.owner,))
+
+    def _delete_claimed(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM journal WHERE claimed_by = ?', (self.owner,))
+
+    async def flush(self) -> int:
+        batch = await asyncio.to_thread(self._claim_batch)
+        if not batch:
+            return 0
+        rows = [{'user_id': user_id, 'data': data} for _, user_id, data in batch]
+        try:
+            ids = await session_store.insert(rows)
+        except BaseException:
+            # Hands the batch back at once rather than after the claim times out.
+            await asyncio.to_thread(self._release)
+            raise
+        await asyncio.to_thread(self._delete_claimed)
+        self.pending = max(self.pending - len(batch), 0)
+        # Counted once stored, after the cleanup: a failure here loses the batch's counts
+        # rather than storing its sessions twice.
+        try:
+            await session_analytics.record(list(zip(ids, (data for _, _, data in batch))))
+        except Exception:
+            logger.exception("No se pudieron actualizar las analíticas.")
+        return len(batch)
+
+    async def _run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                while await self.flush() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("No se pudieron guardar las sesiones pendientes; se reintentará.")
+
+    async def close(self):
+        self.closing = True
+        self.wakeup.set()
+        await self.task
+        try:
+            while await self.flush():
+                pass
+        except Exception:
+            logger.exception("Quedan sesiones en el journal; se enviarán al reiniciar.")
+        self.connection.close()
+        self.connection = None
+
+
+session_journal = SessionJournal()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import SQLITE_LATENCY, SUPABASE_LATENCY
+from supabaseConfig import get_supabase_client
+
+load_dotenv()
+
+# 'supabase' keeps sessions in the project's `sessions` table; 'sqlite' in a local file, for
+# offline runs, load tests and single-host deployments.
+SESSION_STORE = os.getenv('SESSION_STORE', 'supabase')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+
+SESSION_COLUMNS = ('id', 'created_at', 'user_id', 'data')
+
+
+class SessionStore(ABC):
+    # Both backends return rows as dicts of the requested columns (a comma-separated subset of
+    # SESSION_COLUMNS, or '*') and page on the id, which grows with every insert.
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def select(self, user_id: str, limit: int, before: Optional[int] = None, since: Optional[int] = None,
+                     columns: str = '*') -> List[dict]:
+        pass
+
+    @abstractmethod
+    async def insert(self, rows: List[Dict[str, str]]) -> List[int]:
+        # Returns the ids the rows were stored under.
+        pass
+
+    @abstractmethod
+    async def scan(self, after: int, through: int, limit: int) -> List[dict]:
+        # Every user's sessions with `after` < id <= `through`, oldest first: batch jobs walk the
+        # whole table with this, a page at a time.
+        pass
+
+    @abstractmethod
+    async def last_id(self) -> int:
+        pass
+
+
+class SupabaseSessionStore(SessionStore):
+    async def select(self, user_id: str, limit: int, before: Optional[int] = None, since: Optional[int] = None,
+                     columns: str = '*') -> List[dict]:
+        # Keyset pagination on the identity column: history pages go newest first below `before`,
+        # incremental sync returns sessions newer than `since` oldest first.
+        query = get_supabase_client().table('sessions').select(columns).eq('user_id', user_id)
+        if since is not None:
+            query = query.gt('id', since).order('id')
+        else:
+            if before is not None:
+                query = query.lt('id', before)
+            query = query.order('id', desc=True)
+        with SUPABASE_LATENCY.time('select_sessions'):
+            response = await query.limit(limit).execute()
+        return response.data
+
+    async def insert(self, rows: List[Dict[str, str]]) -> List[int]:
+        with SUPABASE_LATENCY.time('insert_sessions'):
+            response = await get_supabase_client().table('sessions').insert(rows).select('id').execute()
+        return [row['id'] for row in response.data]
+
+    async def scan(self, after: int, through: int, limit: int) -> List[dict]:
+        query = (get_supabase_client().table('sessions').select('id,created_at,data')
+                 .gt('id', after).lte('id', through).order('id').limit(limit))
+        with SUPABASE_LATENCY.time('scan_sessions'):
+            response = await query.execute()
+        return response.data
+
+    async def last_id(self) -> int:
+        query = get_supabase_client().table('sessions').select('id').order('id', desc=True).limit(1)
+        with SUPABASE_LATENCY.time('last_session_id'):
+            response = await query.execute()
+        return response.data[0]['id'] if response.data else 0
+
+
+class SQLiteSessionStore(SessionStore):
+    # WAL mode, so reads never wait for the writer: each executor thread reads through its own
+    # connection, while inserts share one connection and run one transaction per batch. The
+    # file may be shared by several worker processes; SQLite serializes their writes.
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self.writer: Optional[sqlite3.Connection] = None
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.readers: List[sqlite3.Connection] = []
+        self.readers_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA busy_timeout=5000')
+        return connection
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    def _open(self):
+        self.writer = self._connect()
+        self.writer.execute('PRAGMA journal_mode=WAL')
+        self.writer.execute('PRAGMA synchronous=FULL')
+        # The created_at default matches the ISO 8601 form PostgREST returns for timestamptz.
+        self.writer.executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+                user_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions (user_id);
+            CREATE INDEX IF NOT EXISTS sessions_user_created_at ON sessions (user_id, created_at);
+        ''')
+
+    async def close(self):
+        with self.readers_lock:
+            readers, self.readers = self.readers, []
+        for connection in readers:
+            connection.close()
+        self.local = threading.local()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self._connect()
+            with self.readers_lock:
+                self.readers.append(connection)
+        return connection
+
+    async def select(self, user_id: str, limit: int, before: Optional[int] = None, since: Optional[int] = None,
+                     columns: str = '*') -> List[dict]:
+        # `columns` has been checked against SESSION_COLUMNS, so it is safe to interpolate.
+        names = ', '.join(SESSION_COLUMNS) if columns == '*' else columns
+        sql = f'SELECT {names} FROM sessions WHERE user_id = ?'
+        parameters = [user_id]
+        if since is not None:
+            sql += ' AND id > ? ORDER BY id'
+            parameters.append(since)
+        else:
+            if before is not None:
+                sql += ' AND id < ?'
+                parameters.append(before)
+            sql += ' ORDER BY id DESC'
+        sql += ' LIMIT ?'
+        parameters.append(limit)
+        with SQLITE_LATENCY.time('select_sessions'):
+            return await asyncio.to_thread(self._select, sql, parameters)
+
+    def _select(self, sql: str, parameters: list) -> List[dict]:
+        return [dict(row) for row in self._reader().execute(sql, parameters)]
+
+    async def insert(self, rows: List[Dict[str, str]]) -> List[int]:
+        with SQLITE_LATENCY.time('insert_sessions'):
+            return await asyncio.to_thread(self._insert, rows)
+
+    def _insert(self, rows: List[Dict[str, str]]) -> List[int]:
+        with self.write_lock:
+            self.writer.execute('BEGIN IMMEDIATE')
+            try:
+                self.writer.executemany('INSERT INTO sessions (user_id, data) VALUES (:user_id, :data)', rows)
+                last = self.writer.execute('SELECT last_insert_rowid()').fetchone()[0]
+            except BaseException:
+                self.writer.execute('ROLLBACK')
+                raise
+            self.writer.execute('COMMIT')
+        # The transaction holds the write lock, so the batch got consecutive ids.
+        return list(range(last - len(rows) + 1, last + 1))
+
+    async def scan(self, after: int, through: int, limit: int) -> List[dict]:
+        sql = 'SELECT id, created_at, data FROM sessions WHERE id > ? AND id <= ? ORDER BY id LIMIT ?'
+        with SQLITE_LATENCY.time('scan_sessions'):
+            return await asyncio.to_thread(self._select, sql, [after, through, limit])
+
+    async def last_id(self) -> int:
+        with SQLITE_LATENCY.time('last_session_id'):
+            rows = await asyncio.to_thread(self._select, 'SELECT MAX(id) AS id FROM sessions', [])
+        return rows[0]['id'] or 0
+
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    if kind == 'supabase':
+        return SupabaseSessionStore()
+    if kind == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError("SESSION_STORE debe ser 'supabase' o 'sqlite'.")
+
+
+session_store = create_session_store()
@@ -1,10 +1,14 @@
+import logging
+from typing import Dict
+
 from experta import *
-from pgmpy.models import BayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.inference import VariableElimination
 
 from dtos import Quiz, Question
-from entity import Expert
+from entity import Expert, fact_values
+from modelRegistry import register_model, get_model
+from resultCatalog import band_of, register_texts
+
+logger = logging.getLogger(__name__)
 
 stress_quiz = Quiz([
         Question(
@@ -57,75 +61,133 @@ stress_quiz = Quiz([
         )
     ])
 
-class StressExpertSystem(KnowledgeEngine):
+
+def build_stress_model():
+    from pgmpy.factors.discrete import TabularCPD
+    from pgmpy.models import BayesianNetwork
+
+    model = BayesianNetwork([
+        ('CuestionesCronicas', 'FactoresAmbientales'),
+        ('SituacionesCotidianas', 'FactoresAmbientales'),
+        ('SucesosVitales', 'FactoresAmbientales'),
+        ('FactoresAmbientales', 'Estrés'),
+        ('SusceptibilidadInterna', 'FactoresInternos'),
+        ('ValoracionCognitiva', 'FactoresInternos'),
+        ('FactoresInternos', 'Estrés'),
+        ('RelacionesInterpersonales', 'FactoresPersonalesSociales'),
+        ('PresionLaboralAcademica', 'FactoresPersonalesSociales'),
+        ('FactoresPersonalesSociales', 'Estrés'),
+        ('FaltaApoyoSocial', 'Estrés')
+    ])
+
+    cpd_cuestiones_cronicas = TabularCPD(variable='CuestionesCronicas', variable_card=2, values=[[0.8], [0.2]])
+    cpd_situaciones_cotidianas = TabularCPD(variable='SituacionesCotidianas', variable_card=2,
+                                            values=[[0.85], [0.15]])
+    cpd_sucesos_vitales = TabularCPD(variable='SucesosVitales', variable_card=2, values=[[0.9], [0.1]])
+    cpd_factores_ambientales = TabularCPD(variable='FactoresAmbientales', variable_card=2,
+                                          values=[[0.9, 0.7, 0.5, 0.3, 0.7, 0.5, 0.3, 0.1],
+                                                  [0.1, 0.3, 0.5, 0.7, 0.3, 0.5, 0.7, 0.9]],
+                                          evidence=['CuestionesCronicas', 'SituacionesCotidianas',
+                                                    'SucesosVitales'],
+                                          evidence_card=[2, 2, 2])
+
+    cpd_susceptibilidad_interna = TabularCPD(variable='SusceptibilidadInterna', variable_card=2,
+                                             values=[[0.75], [0.25]])
+    cpd_valoracion_cognitiva = TabularCPD(variable='ValoracionCognitiva', variable_card=2, values=[[0.7], [0.3]])
+    cpd_factores_internos = TabularCPD(variable='FactoresInternos', variable_card=2,
+                                       values=[[0.9, 0.6, 0.3, 0.1],
+                                               [0.1, 0.4, 0.7, 0.9]],
+                                       evidence=['SusceptibilidadInterna', 'ValoracionCognitiva'],
+                                       evidence_card=[2, 2])
+
+    cpd_relaciones_interpersonales = TabularCPD(variable='RelacionesInterpersonales', variable_card=2,
+                                                values=[[0.65], [0.35]])
+    cpd_presion_laboral_academica = TabularCPD(variable='PresionLaboralAcademica', variable_card=2,
+                                               values=[[0.6], [0.4]])
+    cpd_factores_personales_sociales = TabularCPD(variable='FactoresPersonalesSociales', variable_card=2,
+                                                  values=[[0.9, 0.7, 0.5, 0.3],
+                                                          [0.1, 0.3, 0.5, 0.7]],
+                                                  evidence=['RelacionesInterpersonales', 'PresionLaboralAcademica'],
+                                                  evidence_card=[2, 2])
+
+    cpd_falta_apoyo_social = TabularCPD(variable='FaltaApoyoSocial', variable_card=2, values=[[0.55], [0.45]])
+
+    cpd_estres = TabularCPD(variable='Estrés', variable_card=2,
+                            values=[
+                                [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.7, 0.6, 0.5, 0.4, 0.6, 0.5, 0.4, 0.3],
+                                [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.3, 0.4, 0.5, 0.6, 0.4, 0.5, 0.6, 0.7]],
+                            evidence=['FactoresAmbientales', 'FactoresInternos', 'FactoresPersonalesSociales',
+                                      'FaltaApoyoSocial'],
+                            evidence_card=[2, 2, 2, 2])
+
+    model.add_cpds(cpd_cuestiones_cronicas, cpd_situaciones_cotidianas, cpd_sucesos_vitales,
+                   cpd_factores_ambientales,
+                   cpd_susceptibilidad_interna, cpd_valoracion_cognitiva, cpd_factores_internos,
+                   cpd_relaciones_interpersonales, cpd_presion_laboral_academica,
+                   cpd_factores_personales_sociales,
+                   cpd_falta_apoyo_social, cpd_estres)
+    model.check_model()
+    return model
+
+
+stress_evidence = [
+    'CuestionesCronicas', 'SituacionesCotidianas', 'SucesosVitales', 'SusceptibilidadInterna',
+    'ValoracionCognitiva', 'RelacionesInterpersonales', 'PresionLaboralAcademica', 'FaltaApoyoSocial'
+]
+
+
+def encode_stress_evidence(answers) -> Dict[str, int]:
+    return {
+        'CuestionesCronicas': 0 if answers['cuestiones_cronicas'] == '2' else 1,
+        'SituacionesCotidianas': 0 if answers['situaciones_cotidianas'] == '2' else 1,
+        'SucesosVitales': 0 if answers['sucesos_vitales'] == 'No' else 1,
+        'SusceptibilidadInterna': 0 if answers['susceptibilidad_interna'] == '2' else 1,
+        'ValoracionCognitiva': 0 if answers['valoracion_cognitiva'] == '2' else 1,
+        'RelacionesInterpersonales': 0 if answers['relaciones_interpersonales'] == '2' else 1,
+        'PresionLaboralAcademica': 0 if answers['presion_laboral'] == '2' else 1,
+        'FaltaApoyoSocial': 0 if answers['falta_apoyo_social'] == '2' else 1,
+    }
+
+
+stress_texts = {
+    'chronic_issues': "Busque apoyo profesional para tratar condiciones crónicas de estrés.",
+    'daily_stressors': "Pruebe técnicas de relajación y mindfulness para reducir el estrés diario.",
+    'life_events': "Considere técnicas de manejo del estrés para eventos recientes.",
+    'internal_susceptibility': "Evalúe su predisposición fisiológica con un profesional de la salud.",
+    'cognitive_appraisal': "Trabaje en la reestructuración cognitiva para mejorar sus pensamientos negativos.",
+    'interpersonal_conflict': "Fortalezca sus relaciones interpersonales y resuelva conflictos de manera asertiva.",
+    'work_pressure': "Gestione su carga laboral y busque equilibrio entre trabajo y vida personal.",
+    'social_support': "Busque construir una red de apoyo social para mejorar su bienestar.",
+    'posterior': "Probabilidad calculada de estrés: {posterior}",
+    'band_low':
+        "Siga practicando técnicas de manejo del estrés y busque mantener un equilibrio saludable en su vida diaria.",
+    'band_moderate':
+        "Además de las técnicas de manejo del estrés, considere hablar con un profesional de la salud mental para obtener apoyo adicional.",
+    'band_moderately_high':
+        "Es importante buscar formas adicionales de reducir el estrés, como practicar actividades físicas regularmente y establecer límites saludables.",
+    'band_high':
+        "Se recomienda encarecidamente buscar ayuda profesional para abordar y gestionar su estrés de manera efectiva.",
+}
+
+
+register_model('stress', build_stress_model, 'Estrés', stress_evidence, encode_stress_evidence)
+register_texts('stress', stress_texts, bands=('band_low', 'band_moderate', 'band_moderately_high', 'band_high'),
+               thresholds=(0.30, 0.40, 0.50, 0.60))
+
+
+class StressExpertSystem(Expert):
+    condition = 'stress'
+
     @DefFacts()
     def _initial_action(self):
         yield Fact(action="start")
 
     def __init__(self):
         super().__init__()
-        self.model = BayesianNetwork([
-            ('CuestionesCronicas', 'FactoresAmbientales'),
-            ('SituacionesCotidianas', 'FactoresAmbientales'),
-            ('SucesosVitales', 'FactoresAmbientales'),
-            ('FactoresAmbientales', 'Estrés'),
-            ('SusceptibilidadInterna', 'FactoresInternos'),
-            ('ValoracionCognitiva', 'FactoresInternos'),
-            ('FactoresInternos', 'Estrés'),
-            ('RelacionesInterpersonales', 'FactoresPersonalesSociales'),
-            ('PresionLaboralAcademica', 'FactoresPersonalesSociales'),
-            ('FactoresPersonalesSociales', 'Estrés'),
-            ('FaltaApoyoSocial', 'Estrés')
-        ])
-
-        cpd_cuestiones_cronicas = TabularCPD(variable='CuestionesCronicas', variable_card=2, values=[[0.8], [0.2]])
-        cpd_situaciones_cotidianas = TabularCPD(variable='SituacionesCotidianas', variable_card=2,
-                                                values=[[0.85], [0.15]])
-        cpd_sucesos_vitales = TabularCPD(variable='SucesosVitales', variable_card=2, values=[[0.9], [0.1]])
-        cpd_factores_ambientales = TabularCPD(variable='FactoresAmbientales', variable_card=2,
-                                              values=[[0.9, 0.7, 0.5, 0.3, 0.7, 0.5, 0.3, 0.1],
-                                                      [0.1, 0.3, 0.5, 0.7, 0.3, 0.5, 0.7, 0.9]],
-                                              evidence=['CuestionesCronicas', 'SituacionesCotidianas',
-                                                        'SucesosVitales'],
-                                              evidence_card=[2, 2, 2])
-
-        cpd_susceptibilidad_interna = TabularCPD(variable='SusceptibilidadInterna', variable_card=2,
-                                                 values=[[0.75], [0.25]])
-        cpd_valoracion_cognitiva = TabularCPD(variable='ValoracionCognitiva', variable_card=2, values=[[0.7], [0.3]])
-        cpd_factores_internos = TabularCPD(variable='FactoresInternos', variable_card=2,
-                                           values=[[0.9, 0.6, 0.3, 0.1],
-                                                   [0.1, 0.4, 0.7, 0.9]],
-                                           evidence=['SusceptibilidadInterna', 'ValoracionCognitiva'],
-                                           evidence_card=[2, 2])
-
-        cpd_relaciones_interpersonales = TabularCPD(variable='RelacionesInterpersonales', variable_card=2,
-                                                    values=[[0.65], [0.35]])
-        cpd_presion_laboral_academica = TabularCPD(variable='PresionLaboralAcademica', variable_card=2,
-                                                   values=[[0.6], [0.4]])
-        cpd_factores_personales_sociales = TabularCPD(variable='FactoresPersonalesSociales', variable_card=2,
-                                                      values=[[0.9, 0.7, 0.5, 0.3],
-                                                              [0.1, 0.3, 0.5, 0.7]],
-                                                      evidence=['RelacionesInterpersonales', 'PresionLaboralAcademica'],
-                                                      evidence_card=[2, 2])
-
-        cpd_falta_apoyo_social = TabularCPD(variable='FaltaApoyoSocial', variable_card=2, values=[[0.55], [0.45]])
-
-        cpd_estres = TabularCPD(variable='Estrés', variable_card=2,
-                                values=[
-                                    [0.9, 0.8, 0.7, 0.6, 0.8, 0.7, 0.6, 0.5, 0.7, 0.6, 0.5, 0.4, 0.6, 0.5, 0.4, 0.3],
-                                    [0.1, 0.2, 0.3, 0.4, 0.2, 0.3, 0.4, 0.5, 0.3, 0.4, 0.5, 0.6, 0.4, 0.5, 0.6, 0.7]],
-                                evidence=['FactoresAmbientales', 'FactoresInternos', 'FactoresPersonalesSociales',
-                                          'FaltaApoyoSocial'],
-                                evidence_card=[2, 2, 2, 2])
-
-        self.model.add_cpds(cpd_cuestiones_cronicas, cpd_situaciones_cotidianas, cpd_sucesos_vitales,
-                            cpd_factores_ambientales,
-                            cpd_susceptibilidad_interna, cpd_valoracion_cognitiva, cpd_factores_internos,
-                            cpd_relaciones_interpersonales, cpd_presion_laboral_academica,
-                            cpd_factores_personales_sociales,
-                            cpd_falta_apoyo_social, cpd_estres)
-        self.model.check_model()
-        self.inference = VariableElimination(self.model)
+        compiled = get_model(self.condition)
+        self.model = compiled.model
+        self.inference = compiled.inference
+        self.posterior = compiled.posterior
         self.recommendations = []
         self.diagnosis = []
 
@@ -143,53 +205,51 @@ class StressExpertSystem(KnowledgeEngine):
     @Rule(Fact(action='process_cuestiones_cronicas'), AS.cuestiones_cronicas << Fact(cuestiones_cronicas=W()))
     def process_cuestiones_cronicas(self, cuestiones_cronicas):
         if cuestiones_cronicas['cuestiones_cronicas'] == '1':
-            self.recommendations.append("Busque apoyo profesional para tratar condiciones crónicas de estrés.")
+            self.recommend('chronic_issues')
         self.declare(Fact(action='process_situaciones_cotidianas'))
 
     @Rule(Fact(action='process_situaciones_cotidianas'), AS.situaciones_cotidianas << Fact(situaciones_cotidianas=W()))
     def process_situaciones_cotidianas(self, situaciones_cotidianas):
         if situaciones_cotidianas['situaciones_cotidianas'] == '1':
-            self.recommendations.append("Pruebe técnicas de relajación y mindfulness para reducir el estrés diario.")
+            self.recommend('daily_stressors')
         self.declare(Fact(action='process_sucesos_vitales'))
 
     @Rule(Fact(action='process_sucesos_vitales'), AS.sucesos_vitales << Fact(sucesos_vitales=W()))
     def process_sucesos_vitales(self, sucesos_vitales):
         if sucesos_vitales['sucesos_vitales'] == '1':
-            self.recommendations.append("Considere técnicas de manejo del estrés para eventos recientes.")
+            self.recommend('life_events')
         self.declare(Fact(action='process_susceptibilidad_interna'))
 
     @Rule(Fact(action='process_susceptibilidad_interna'),
           AS.susceptibilidad_interna << Fact(susceptibilidad_interna=W()))
     def process_susceptibilidad_interna(self, susceptibilidad_interna):
         if susceptibilidad_interna['susceptibilidad_interna'] == '1':
-            self.recommendations.append("Evalúe su predisposición fisiológica con un profesional de la salud.")
+            self.recommend('internal_susceptibility')
         self.declare(Fact(action='process_valoracion_cognitiva'))
 
     @Rule(Fact(action='process_valoracion_cognitiva'), AS.valoracion_cognitiva << Fact(valoracion_cognitiva=W()))
     def process_valoracion_cognitiva(self, valoracion_cognitiva):
         if valoracion_cognitiva['valoracion_cognitiva'] == '1':
-            self.recommendations.append(
-                "Trabaje en la reestructuración cognitiva para mejorar sus pensamientos negativos.")
+            self.recommend('cognitive_appraisal')
         self.declare(Fact(action='process_relaciones_interpersonales'))
 
     @Rule(Fact(action='process_relaciones_interpersonales'),
           AS.relaciones_interpersonales << Fact(relaciones_interpersonales=W()))
     def process_relaciones_interpersonales(self, relaciones_interpersonales):
         if relaciones_interpersonales['relaciones_interpersonales'] == '1':
-            self.recommendations.append(
-                "Fortalezca sus relaciones interpersonales y resuelva conflictos de manera asertiva.")
+            self.recommend('interpersonal_conflict')
         self.declare(Fact(action='process_presion_laboral'))
 
     @Rule(Fact(action='process_presion_laboral'), AS.presion_laboral << Fact(presion_laboral=W()))
     def process_presion_laboral(self, presion_laboral):
         if presion_laboral['presion_laboral'] == '1':
-            self.recommendations.append("Gestione su carga laboral y busque equilibrio entre trabajo y vida personal.")
+            self.recommend('work_pressure')
         self.declare(Fact(action='process_falta_apoyo_social'))
 
     @Rule(Fact(action='process_falta_apoyo_social'), AS.falta_apoyo_social << Fact(falta_apoyo_social=W()))
     def process_falta_apoyo_social(self, falta_apoyo_social):
         if falta_apoyo_social['falta_apoyo_social'] == '1':
-            self.recommendations.append("Busque construir una red de apoyo social para mejorar su bienestar.")
+            self.recommend('social_support')
         self.declare(Fact(action='evaluate_stress_risk'))
 
     @Rule(Fact(action='evaluate_stress_risk'),
@@ -204,39 +264,31 @@ class StressExpertSystem(KnowledgeEngine):
     def evaluate_stress_risk(self, cuestiones_cronicas, situaciones_cotidianas, sucesos_vitales,
                              susceptibilidad_interna, valoracion_cognitiva, relaciones_interpersonales, presion_laboral,
                              falta_apoyo_social):
-        evidence = {
-            'CuestionesCronicas': 0 if cuestiones_cronicas['cuestiones_cronicas'] == '2' else 1,
-            'SituacionesCotidianas': 0 if situaciones_cotidianas['situaciones_cotidianas'] == '2' else 1,
-            'SucesosVitales': 0 if sucesos_vitales['sucesos_vitales'] == 'No' else 1,
-            'SusceptibilidadInterna': 0 if susceptibilidad_interna['susceptibilidad_interna'] == '2' else 1,
-            'ValoracionCognitiva': 0 if valoracion_cognitiva['valoracion_cognitiva'] == '2' else 1,
-            'RelacionesInterpersonales': 0 if relaciones_interpersonales['relaciones_interpersonales'] == '2' else 1,
-            'PresionLaboralAcademica': 0 if presion_laboral['presion_laboral'] == '2' else 1,
-            'FaltaApoyoSocial': 0 if falta_apoyo_social['falta_apoyo_social'] == '2' else 1,
-        }
-        prob_stress = self.inference.query(variables=['Estrés'], evidence=evidence).values[1]
-        print("Probabilidad calculada de estrés:", prob_stress)
-        self.recommendations.append(f"Probabilidad calculada de estrés: {prob_stress}")
-
-        if 0.30 <= prob_stress < 0.40:
+        evidence = encode_stress_evidence(fact_values(cuestiones_cronicas, situaciones_cotidianas, sucesos_vitales,
+                                                      susceptibilidad_interna, valoracion_cognitiva,
+                                                      relaciones_interpersonales, presion_laboral,
+                                                      falta_apoyo_social))
+        prob_stress = self.posterior_of(evidence)
+        logger.debug("Probabilidad calculada de estrés: %s", prob_stress)
+        self.probability = float(prob_stress)
+        self.band = band_of(self.condition, prob_stress)
+        self.recommend('posterior')
+
+        if self.band == 1:
             self.diagnosis.append("Su probabilidad de estrés está en un rango bajo.")
-            self.recommendations.append(
-                "Siga practicando técnicas de manejo del estrés y busque mantener un equilibrio saludable en su vida diaria.")
+            self.recommend('band_low')
 
-        elif 0.40 <= prob_stress < 0.50:
+        elif self.band == 2:
             self.diagnosis.append("Su probabilidad de estrés es moderada.")
-            self.recommendations.append(
-                "Además de las técnicas de manejo del estrés, considere hablar con un profesional de la salud mental para obtener apoyo adicional.")
+            self.recommend('band_moderate')
 
-        elif 0.50 <= prob_stress < 0.60:
+        elif self.band == 3:
             self.diagnosis.append("Su probabilidad de estrés es moderadamente alta.")
-            self.recommendations.append(
-                "Es importante buscar formas adicionales de reducir el estrés, como practicar actividades físicas regularmente y establecer límites saludables.")
+            self.recommend('band_moderately_high')
 
-        elif prob_stress >= 0.60:
+        elif self.band == 4:
             self.diagnosis.append("Su probabilidad de estrés es alta.")
-            self.recommendations.append(
-                "Se recomienda encarecidamente buscar ayuda profesional para abordar y gestionar su estrés de manera efectiva.")
+            self.recommend('band_high')
 
     def get_recommendations(self):
         return self.recommendations
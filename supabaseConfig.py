@@ -1,4 +1,7 @@
-from supabase import create_client, Client
+from typing import Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
 from dotenv import load_dotenv
 import os
 
@@ -6,9 +9,64 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+SUPABASE_MAX_CONNECTIONS = int(os.getenv('SUPABASE_MAX_CONNECTIONS', 20))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('SUPABASE_MAX_KEEPALIVE_CONNECTIONS', 10))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', 30))
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', 10))
+
+_http_client: Optional[httpx.AsyncClient] = None
+_client: Optional[AsyncClient] = None
+_auth_client: Optional[AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def set_supabase_transport(transport: Optional[httpx.AsyncBaseTransport]):
+    # Lets benchmarks and local runs route Supabase traffic to a stub instead of the network.
+    global _transport
+    _transport = transport
 
 
-def get_supabase_client() -> Client:
+async def open_supabase_clients(transport: Optional[httpx.AsyncBaseTransport] = None):
+    global _http_client, _client, _auth_client
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("Las variables de entorno SUPABASE_URL y SUPABASE_KEY deben estar configuradas.")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    _http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS,
+                            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY),
+        timeout=SUPABASE_TIMEOUT,
+        transport=transport or _transport,
+    )
+    # Signing a user in swaps the client's Authorization header for that user's token, so
+    # auth calls get their own client; both share the same connection pool.
+    _client = await acreate_client(SUPABASE_URL, SUPABASE_KEY, _client_options())
+    _auth_client = await acreate_client(SUPABASE_URL, SUPABASE_KEY, _client_options())
+
+
+async def close_supabase_clients():
+    global _http_client, _client, _auth_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = _client = _auth_client = None
+
+
+def _client_options() -> AsyncClientOptions:
+    return AsyncClientOptions(httpx_client=_http_client, persist_session=False, auto_refresh_token=False)
+
+
+def get_supabase_client() -> AsyncClient:
+    if _client is None:
+        raise RuntimeError("El cliente de Supabase no está inicializado.")
+    return _client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    if _http_client is None:
+        raise RuntimeError("El cliente de Supabase no está inicializado.")
+    return _http_client
+
+
+def get_supabase_auth_client() -> AsyncClient:
+    if _auth_client is None:
+        raise RuntimeError("El cliente de Supabase no está inicializado.")
+    return _auth_client
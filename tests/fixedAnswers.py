@@ -0,0 +1,39 @@
+import random
+from typing import Dict, List
+
+from experts import conditions
+
+SINGLE_CHOICE = 1
+SCORE = 3
+SEED = 7
+RANDOM_SETS = 24
+
+
+def canonical_values(question) -> List:
+    if question.answer_mode == SCORE:
+        return list(range(0, len(question.options) * 4 + 1))
+    return [str(number) for number in range(1, len(question.options) + 1)]
+
+
+def raw_values(question) -> List:
+    # Also what clients have been seen to send besides the canonical form: 'No', the int 1 and
+    # scores as strings, which the rule chains treat differently from '1'..'n' and ints.
+    if question.answer_mode == SCORE:
+        return canonical_values(question) + ['3']
+    return canonical_values(question) + ['No', 1]
+
+
+def answer_sets(condition: str, values=raw_values) -> List[Dict]:
+    # The first and the last option everywhere, then seeded random picks: the same sets on
+    # every run.
+    quiz = conditions[condition][1]
+    rng = random.Random(f'{SEED}-{condition}')
+    sets = [{question.fact: values(question)[0] for question in quiz.questions},
+            {question.fact: canonical_values(question)[-1] for question in quiz.questions}]
+    for _ in range(RANDOM_SETS):
+        sets.append({question.fact: rng.choice(values(question)) for question in quiz.questions})
+    return sets
+
+
+def canonical_answer_sets(condition: str) -> List[Dict]:
+    return answer_sets(condition, canonical_values)
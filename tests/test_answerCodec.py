@@ -0,0 +1,37 @@
+import pytest
+
+from answerCodec import codecs
+from experts import conditions, get_quiz
+from tests.fixedAnswers import SCORE, answer_sets, canonical_answer_sets, canonical_values
+
+
+@pytest.mark.parametrize('condition', list(conditions))
+def test_round_trip(condition):
+    codec = codecs[condition]
+    for answers in canonical_answer_sets(condition):
+        packed = codec.encode(answers)
+        assert codec.decode(packed) == answers
+        assert codec.from_text(codec.to_text(packed)) == packed
+
+
+@pytest.mark.parametrize('condition', list(conditions))
+def test_non_canonical_answers_are_rejected(condition):
+    codec = codecs[condition]
+    canonical = {question.fact: canonical_values(question) for question in get_quiz(condition).questions}
+    for answers in answer_sets(condition):
+        if any(value not in canonical[fact] for fact, value in answers.items()):
+            with pytest.raises(ValueError):
+                codec.encode(answers)
+
+
+@pytest.mark.parametrize('condition', list(conditions))
+def test_out_of_range_codes_are_rejected(condition):
+    codec = codecs[condition]
+    with pytest.raises(ValueError):
+        codec.decode(1 << codec.bits)
+    with pytest.raises(ValueError):
+        codec.from_text(codec.to_text(0) + 'AA')
+    for field in codec.fields:
+        if field.answer_mode == SCORE or field.options < 1 << field.width:
+            with pytest.raises(ValueError):
+                codec.decode(((1 << field.width) - 1) << field.shift)
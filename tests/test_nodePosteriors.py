@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from modelRegistry import get_marginals, get_model
+
+NETWORK_CONDITIONS = ['stress', 'anxiety', 'depression', 'insomnia']
+TOLERANCE = 1e-9
+
+
+@pytest.mark.parametrize('condition', NETWORK_CONDITIONS)
+def test_marginals_match_inference_for_every_pattern(condition):
+    compiled = get_model(condition)
+    table = get_marginals(condition)
+    for index in range(1 << len(table.evidence)):
+        evidence = {name: index >> bit & 1 for bit, name in enumerate(table.evidence)}
+        marginals = table.lookup(evidence)
+        for node in table.nodes:
+            expected = compiled.inference.query(variables=[node], evidence=evidence, show_progress=False).values
+            np.testing.assert_allclose(marginals[node], expected, rtol=0, atol=TOLERANCE)
+        assert marginals[compiled.posterior.target][1] == pytest.approx(compiled.posterior.values[index],
+                                                                        abs=TOLERANCE)
@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+from dtos import QuizAnswers
+from experts import conditions, get_analysis
+from resultCatalog import parse_texts, render
+from tests.fixedAnswers import canonical_answer_sets
+
+# What the rule engines returned before results became codes: the texts clients have stored.
+with open(os.path.join(os.path.dirname(__file__), 'legacyResults.json'), encoding='utf-8') as file:
+    LEGACY_RESULTS = json.load(file)
+
+
+@pytest.mark.parametrize('case', LEGACY_RESULTS, ids=lambda case: case['condition'])
+def test_rendered_codes_match_legacy_texts(case):
+    result = get_analysis(QuizAnswers(condition=case['condition'], answers=case['answers']))
+    assert render(result) == case['texts']
+
+
+@pytest.mark.parametrize('condition', [condition for condition in conditions if condition != 'screening'])
+def test_parse_texts_recovers_posterior_and_band(condition):
+    for answers in canonical_answer_sets(condition):
+        result = get_analysis(QuizAnswers(condition=condition, answers=answers))
+        [parsed] = parse_texts(render(result))
+        assert (parsed.condition, parsed.posterior, parsed.band) == (result.condition, result.posterior, result.band)
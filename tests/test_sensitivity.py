@@ -0,0 +1,25 @@
+import pytest
+
+from dtos import QuizAnswers
+from experts import get_sensitivity
+from modelRegistry import get_model
+from tests.fixedAnswers import canonical_answer_sets
+
+NETWORK_CONDITIONS = ['stress', 'anxiety', 'depression', 'insomnia']
+TOLERANCE = 1e-9
+
+
+@pytest.mark.parametrize('condition', NETWORK_CONDITIONS)
+def test_flips_match_inference(condition):
+    compiled = get_model(condition)
+    for answers in canonical_answer_sets(condition):
+        result = get_sensitivity(QuizAnswers(condition=condition, answers=answers))
+        evidence = compiled.encode(answers)
+        for factor in result.factors:
+            flipped = {**evidence, factor.factor: 1 - evidence[factor.factor]}
+            expected = compiled.inference.query(variables=[compiled.posterior.target], evidence=flipped,
+                                                show_progress=False).values[1]
+            assert factor.posterior == pytest.approx(expected, abs=TOLERANCE)
+            assert factor.delta == pytest.approx(expected - result.posterior, abs=TOLERANCE)
+        deltas = [abs(factor.delta) for factor in result.factors]
+        assert deltas == sorted(deltas, reverse=True)
@@ -1,11 +1,7 @@
 from experta import *
 
-from dtos import Quiz, Question
-from anxiety import AnxietyExpertSystem
-from depression import DepressionExpertSystem
+from dtos import AnalysisResult, Quiz, Question
 from entity import Expert
-from insomnia import InsomniaExpertSystem
-from stress import StressExpertSystem
 
 
 def ask_menu(question, options):
@@ -87,6 +83,8 @@ screening_quiz = Quiz([
 
 
 class UnifiedExpertSystem(Expert):
+    condition = 'screening'
+
     @DefFacts()
     def _initial_action(self):
         yield Fact(action='collect_general_info')
@@ -129,42 +127,11 @@ class UnifiedExpertSystem(Expert):
     #    else:
     #        return {}
 
-    def redirect_to_insomnia(self, insomnia_input):
-        print("\nRedirigiendo al módulo de diagnóstico de insomnio...")
-        insomnia_engine = InsomniaExpertSystem()
-        insomnia_engine.reset()
-        insomnia_engine.input_data(insomnia_input)
-        insomnia_engine.run()
-        self.recommendations.extend(insomnia_engine.get_recommendations())
-        self.declare(Fact(action='check_irritability'))
-
-    def redirect_to_stress(self, stress_input):
-        print("\nRedirigiendo al módulo de diagnóstico de estrés...")
-        stress_engine = StressExpertSystem()
-        stress_engine.reset()
-        stress_engine.input_data(stress_input)
-        stress_engine.run()
-        self.recommendations.extend(stress_engine.get_recommendations())
-
-    def redirect_to_depression(self, depression_input):
-        print("\nRedirigiendo al módulo de diagnóstico de depresión...")
-        depression_engine = DepressionExpertSystem()
-        depression_engine.reset()
-        depression_engine.input_data(depression_input)
-        depression_engine.run()
-        self.recommendations.extend(depression_engine.get_recommendations())
-
-    def redirect_to_anxiety(self, anxiety_input):
-        print("\nRedirigiendo al módulo de diagnóstico de ansiedad...")
-        anxiety_engine = AnxietyExpertSystem()
-        anxiety_engine.reset()
-        anxiety_engine.input_data(anxiety_input)
-        anxiety_engine.run()
-        self.recommendations.extend(anxiety_engine.get_recommendations())
-
     def get_recommendations(self):
         return self.recommendations
 
     def get_diagnosis(self):
         return self.diagnosis
 
+    def get_result(self):
+        return AnalysisResult(self.condition, None, None, tuple(self.diagnosis))